@@ -7,6 +7,8 @@ Created on 2011-08-26
 
 In EMDAT, the bounderies of an Area of Interest (AOI) is defined as a polygon on the screen. You can 
 optionally define a second polygone inside the first polygone to be excluded from an AOI.
+A composite AOI is defined by several polygons: it covers the union of its inclusion polygons
+minus the union of its exclusion polygons.
 An AOI can be always active (a global AOI) or can be active during certain time intervals.
 In order to calculate the features for an AOI instance, you need to create an AOI_Stat instance and
 map it to a target AOI object by passing it to the AOI_Stat constructor. The resulting AOI_Stat
@@ -14,6 +16,12 @@ will calculate all features related to the given AOI and store them for later re
 """
 from utils import *
 from warnings import warn
+from array import array
+import bisect
+import cPickle
+import hashlib
+import math
+import os
 
 
 
@@ -25,10 +33,11 @@ class AOI():
         Args:
             aid: AOI id
             
-            polyin: the polygon defining the boundaries of the AOI in form of a list of (x,y) tuples
+            polyin: the polygon defining the boundaries of the AOI in form of a list of (x,y) tuples,
+                or a list of such polygons for a composite AOI
             
             polyout: optional polygon inside the boundaries of the AOI that is not part of 
-                the AOI in form of a list of (x,y) tuples
+                the AOI in form of a list of (x,y) tuples, or a list of such polygons
             
             timeseq: the time sequence of the format [(start1, end1), (start2, end2), ...] that 
                 specifies the intervals when this AOI is active
@@ -37,21 +46,44 @@ class AOI():
             an AOI object
         """
         self.aid = aid
-        self.polyin = polyin
-        self.polyout = polyout
+        self.set_coordinates(polyin, polyout)
         self.timeseq = timeseq
 #            self.partial = True
     def set_coordinates(self, polyin, polyout=[]):
         """Sets the coordiantes of the AOI
         
         Args:
-            polyin: the polygon defining the bounderies of the AOI in form of a list of (x,y) tuples
+            polyin: the polygon defining the bounderies of the AOI in form of a list of (x,y) tuples,
+                or a list of such polygons for a composite AOI
             polyout: optional polygon inside the bounderies of the AOI that is not part of the AOI 
-                in form of a list of (x,y) tuples
+                in form of a list of (x,y) tuples, or a list of such polygons
         """
         
         self.polyin = polyin
         self.polyout = polyout
+        self.polyins = _polygon_list(polyin)
+        self.polyouts = _polygon_list(polyout)
+
+    def contains_points(self, xs, ys, ts = None):
+        """Determines for a batch of points which ones are inside the AOI
+        
+        A point is inside the AOI if it is inside one of the polygons of polyins and inside none of
+        the polygons of polyouts.
+        
+        Args:
+            xs: a list of the x coordinates of the points
+            ys: a list of the y coordinates of the points
+            ts: optional list of the timestamps of the points, only used by "MovingAOI"s
+        
+        Returns:
+            a list of booleans for whether each point is inside the AOI
+        """
+        return points_inside_polygons(xs, ys, self.polyins, self.polyouts)
+
+    def get_bounding_box(self):
+        """Returns the (minx, miny, maxx, maxy) bounding box of the inclusion polygons, or None if there are none
+        """
+        return _bounding_box(self.polyins)
             
     def is_active(self,start,end):
         """Determines if an AOI is active during the whole given time interval 
@@ -67,12 +99,7 @@ class AOI():
         if start == -1:
             return False
         if self.timeseq:
-            for intr in self.timeseq:
-                if (start>=intr[0] and start<intr[1])or(end>intr[0] and end<=intr[1]):
-                    return True
-                elif (start<intr[0] and start<intr[1])and(end>intr[0] and end>intr[1]):
-                    warn("Incorrect definition of Dynamic AOI and Segments, AOI info not calculated for AOI:"+self.aid)
-            return False #not active
+            return self.get_intervals().find(start, end, self.aid) is not None
         else:
             return True #global AOI
         
@@ -98,30 +125,373 @@ class AOI():
             print "in:",self.aid
         ovelap_part = []
         if self.timeseq:
-            for intr in self.timeseq:
-                if (start>=intr[0] and start<intr[1])or(end>intr[0] and end<=intr[1]):
-                    if (start>=intr[0] and end<=intr[1]):
-                        ovelap_part=[]
-                    else:
-                        if params.DEBUG:
-                            print "partial:",start,end,":",intr[0],intr[1]
-                        ovstart = max(start,intr[0])
-                        ovend  = min(end,intr[1])
-                        ovelap_part = [ovstart,ovend]
-                    return True, ovelap_part
-                elif (start<intr[0] and start<intr[1])and(end>intr[0] and end>intr[1]):
-                    warn("Incorrect definition of Dynamic AOI and Segments, AOI info not calculated for AOI:"+self.aid)
-
-            return False, [] #not active
+            intr = self.get_intervals().find(start, end, self.aid)
+            if intr is None:
+                return False, [] #not active
+            if (start>=intr[0] and end<=intr[1]):
+                ovelap_part=[]
+            else:
+                if params.DEBUG:
+                    print "partial:",start,end,":",intr[0],intr[1]
+                ovstart = max(start,intr[0])
+                ovend  = min(end,intr[1])
+                ovelap_part = [ovstart,ovend]
+            return True, ovelap_part
         else:
             return True, [] #global AOI
+
+    def is_active_at(self, times):
+        """Determines for a list of timestamps at once if the AOI is active at each of them
+        
+        The timestamps are swept together with the union of the activity intervals, so a sorted list
+        (e.g., the timestamps of a sequence of "Fixation"s) costs a single pass over both.
+        
+        Args:
+            times: a list of timestamps
+            
+        Returns:
+            a list of booleans, the results of is_active(t, t) for each timestamp t
+        """
+        if self.timeseq:
+            active = self.get_intervals().contains_times(times)
+        else:
+            active = [True] * len(times) #global AOI
+        return map(lambda (t, act): act and t != -1, zip(times, active))
+
+    def get_intervals(self):
+        """Returns the AOIIntervals index of timeseq, building it again if timeseq was replaced
+        """
+        if getattr(self, '_intervals', None) is None or self._intervals.timeseq is not self.timeseq:
+            self._intervals = AOIIntervals(self.timeseq)
+        return self._intervals
+
+
+class MovingAOI(AOI):
+    """An AOI whose polygons move over time
+    
+    The polygons are given at keyframes and linearly interpolated between them: each vertex moves in a
+    straight line from its position at a keyframe to its position at the next one. Before the first
+    keyframe and after the last one, the AOI keeps the polygons of that keyframe. All the keyframes have
+    the same number of polygons with the same number of vertices. A point is hit-tested against the AOI
+    as it is at the timestamp of the point.
+    
+    Attributes:
+        keyframes: a list of (timestamp, polyins, polyouts) tuples sorted by timestamp, with polyins and
+            polyouts lists of polygons
+        times: the timestamps of keyframes
+        polyins, polyouts: the polygons at the first keyframe
+    """
+    def __init__(self, aid, keyframes, timeseq=[]):
+        """Inits MovingAOI class
+        
+        Args:
+            aid: AOI id
+            
+            keyframes: a list of (timestamp, polyin) or (timestamp, polyin, polyout) tuples, where polyin
+                and polyout are a polygon (a list of (x,y) tuples) or a list of polygons
+            
+            timeseq: the time sequence of the format [(start1, end1), (start2, end2), ...] that 
+                specifies the intervals when this AOI is active, always active if empty
+            
+        Yields:
+            a MovingAOI object
+        """
+        if not keyframes:
+            raise Exception("no keyframes for the moving AOI:"+aid)
+        self.keyframes = sorted(map(lambda kf: (kf[0], _polygon_list(kf[1]), _polygon_list(kf[2] if len(kf) > 2 else [])),
+                                    keyframes), key = itemgetter(0))
+        shape = lambda polys: map(len, polys)
+        (_, polyins, polyouts) = self.keyframes[0]
+        for (t, frame_polyins, frame_polyouts) in self.keyframes:
+            if shape(frame_polyins) != shape(polyins) or shape(frame_polyouts) != shape(polyouts):
+                raise Exception("keyframes with different polygons for the moving AOI:%s at:%s" %(aid, t))
+        self.times = map(itemgetter(0), self.keyframes)
+        AOI.__init__(self, aid, polyins, polyouts, timeseq)
+
+    def get_polygons(self, t):
+        """Returns the (polyins, polyouts) lists of polygons of the AOI at time t
+        """
+        k = bisect.bisect_right(self.times, t)
+        if k == 0:
+            return self.keyframes[0][1:]
+        if k == len(self.keyframes):
+            return self.keyframes[-1][1:]
+        (t0, polyins0, polyouts0) = self.keyframes[k-1]
+        (t1, polyins1, polyouts1) = self.keyframes[k]
+        f = float(t - t0) / (t1 - t0)
+        return (_interpolate_polygons(polyins0, polyins1, f), _interpolate_polygons(polyouts0, polyouts1, f))
+
+    def contains_points(self, xs, ys, ts = None):
+        """Determines for a batch of points which ones are inside the AOI at the timestamp of each point
+        
+        The points before the first keyframe and after the last one are tested together against the
+        polygons of these keyframes. The other points are first checked against the bounding box of the
+        two keyframes around them; the points inside it are grouped by timestamp and each group is tested
+        together against the polygons interpolated once for its timestamp. Points with distinct timestamps
+        (e.g., consecutive gaze samples) are therefore still tested one at a time.
+        
+        Args:
+            xs: a list of the x coordinates of the points
+            ys: a list of the y coordinates of the points
+            ts: a list of the timestamps of the points
+        
+        Returns:
+            a list of booleans for whether each point is inside the AOI
+        """
+        if ts is None:
+            raise Exception("the timestamps of the points are needed for the moving AOI:"+self.aid)
+        mask = [False] * len(xs)
+        frames = {}
+        for i in xrange(len(xs)):
+            frames.setdefault(bisect.bisect_right(self.times, ts[i]), []).append(i)
+        for k, indices in frames.iteritems():
+            if k == 0 or k == len(self.keyframes):
+                (_, polyins, polyouts) = self.keyframes[0 if k == 0 else -1]
+                inside = points_inside_polygons(map(lambda i: xs[i], indices), map(lambda i: ys[i], indices),
+                                                polyins, polyouts)
+                for i, point_inside in zip(indices, inside):
+                    mask[i] = point_inside
+                continue
+            box = _bounding_box(self.keyframes[k-1][1] + self.keyframes[k][1])
+            instants = {}
+            for i in indices:
+                if xs[i] is None or ys[i] is None or not (box[0] <= xs[i] <= box[2] and box[1] <= ys[i] <= box[3]):
+                    continue
+                instants.setdefault(ts[i], []).append(i)
+            for t, group in instants.iteritems():
+                (polyins, polyouts) = self.get_polygons(t)
+                inside = points_inside_polygons(map(lambda i: xs[i], group), map(lambda i: ys[i], group),
+                                                polyins, polyouts)
+                for i, point_inside in zip(group, inside):
+                    mask[i] = point_inside
+        return mask
+
+    def get_bounding_box(self):
+        """Returns the (minx, miny, maxx, maxy) bounding box of the inclusion polygons of all the keyframes
+        
+        The interpolated polygons always lie inside this box.
+        """
+        return _bounding_box(reduce(lambda polys, kf: polys + kf[1], self.keyframes, []))
+
+
+class AOIIntervals():
+    """Index of the activity intervals of a dynamic AOI
+    
+    The intervals are sorted by start, with the running maximum of their ends, so a query only visits
+    the intervals that can overlap the queried time interval instead of the whole timeseq. The results
+    are the ones of a scan of timeseq in its own order: if several intervals match, the first one in
+    timeseq is returned.
+    
+    Attributes:
+        timeseq: the list of (start, end) intervals of the AOI, in their original order
+        intervals: a list of (start, end, position in timeseq) tuples sorted by start
+        starts: the starts of intervals
+        maxends: for each index k of intervals, the largest end of intervals[0:k+1]
+        covered: the union of the intervals that are not empty, a sorted list of disjoint [start, end] intervals
+    """
+    def __init__(self, timeseq):
+        """Inits AOIIntervals class
+        
+        Args:
+            timeseq: the time sequence of the format [(start1, end1), (start2, end2), ...] of an AOI
+        """
+        self.timeseq = timeseq
+        self.intervals = sorted(map(lambda (k, intr): (intr[0], intr[1], k), enumerate(timeseq)))
+        self.starts = map(lambda intr: intr[0], self.intervals)
+        self.maxends = []
+        maxend = None
+        for intr in self.intervals:
+            maxend = intr[1] if maxend is None else max(maxend, intr[1])
+            self.maxends.append(maxend)
+        self.covered = []
+        for (a, b, _) in self.intervals:
+            if a >= b:
+                continue
+            if self.covered and a <= self.covered[-1][1]:
+                self.covered[-1][1] = max(self.covered[-1][1], b)
+            else:
+                self.covered.append([a, b])
+
+    def find(self, start, end, aid = ''):
+        """Returns the first interval of timeseq that contains the start or the end of a time interval
+        
+        An interval (a, b) matches if a <= start < b or a < end <= b. Like the scan of timeseq, a warning
+        is issued for the intervals strictly inside (start, end) that come before the match.
+        
+        Args:
+            start: time interval start
+            end: time interval end
+            aid: the id of the AOI, for the warning
+        
+        Returns:
+            the matching (start, end) interval of timeseq, or None if there is none
+        """
+        #every interval that matches or is strictly inside (start, end) starts before max(start, end)
+        #and ends after min(start, end)
+        k = bisect.bisect_right(self.starts, max(start, end)) - 1
+        lowest = min(start, end)
+        match = None
+        inside = []
+        while k >= 0 and self.maxends[k] >= lowest:
+            (a, b, position) = self.intervals[k]
+            if (start>=a and start<b)or(end>a and end<=b):
+                if match is None or position < match:
+                    match = position
+            elif (start<a and start<b)and(end>a and end>b):
+                inside.append(position)
+            k -= 1
+        for position in sorted(inside):
+            if match is None or position < match:
+                warn("Incorrect definition of Dynamic AOI and Segments, AOI info not calculated for AOI:"+aid)
+        if match is None:
+            return None
+        return self.timeseq[match]
+
+    def contains_times(self, times):
+        """Returns for each timestamp of a list whether an interval contains it
+        
+        The result for a timestamp t is the one of find(t, t) is not None: t is inside an interval
+        (a, b) with a < b, including its bounds. The timestamps are visited in sorted order while
+        walking covered once, so no interval is visited twice.
+        
+        Args:
+            times: a list of timestamps
+        
+        Returns:
+            a list of booleans, in the order of times
+        """
+        covered = self.covered
+        result = [False] * len(times)
+        k = 0
+        for i in sorted(xrange(len(times)), key = times.__getitem__):
+            t = times[i]
+            while k < len(covered) and covered[k][1] < t:
+                k += 1
+            if k == len(covered):
+                break
+            result[i] = covered[k][0] <= t
+        return result
+
+
+class AOISequence():
+    """The sequence of "AOI"s where the "Fixation"s occurred, stored as integer codes
     
+    Each element of the sequence is the code of an AOI id in the AOI dictionary aids, with the duration
+    of its Fixation. The sequence can be read like the list of AOI ids it encodes (len, iteration,
+    indexing and comparison with a list). It is exported as that list, or as its runs of the same
+    AOI if params.AOI_SEQUENCE_FORMAT is 'rle'.
+    
+    Attributes:
+        aids: the AOI dictionary, a list of AOI ids where code i stands for aids[i]
+        codes: an array of the codes of the AOIs of the sequence
+        durations: an array of the durations of the corresponding "Fixation"s
+    """
+    def __init__(self, aids = None):
+        """Inits AOISequence class with an empty sequence
+        
+        Args:
+            aids: an optional list of AOI ids for the AOI dictionary
+        """
+        self.aids = []
+        self.index = {}
+        self.codes = array('i')
+        self.durations = array('l')
+        for aid in aids or []:
+            self.get_code(aid)
+
+    def get_code(self, aid):
+        """Returns the code of an AOI id, adding the id to the AOI dictionary if it is not in it
+        """
+        if aid not in self.index:
+            self.index[aid] = len(self.aids)
+            self.aids.append(aid)
+        return self.index[aid]
+
+    def append(self, aid, duration):
+        """Appends an AOI id with the duration of its Fixation to the sequence
+        """
+        self.codes.append(self.get_code(aid))
+        self.durations.append(duration)
+
+    def extend(self, other):
+        """Appends the AOI sequence other to this sequence
+        
+        The codes are copied as they are if both sequences have the same AOI dictionary and translated otherwise.
+        """
+        if not self.aids:
+            for aid in other.aids:
+                self.get_code(aid)
+        if other.aids == self.aids:
+            self.codes.extend(other.codes)
+        else:
+            codes = map(self.get_code, other.aids)
+            self.codes.extend(array('i', map(lambda c: codes[c], other.codes)))
+        self.durations.extend(other.durations)
+
+    def run_lengths(self):
+        """Returns the runs of the same AOI in the sequence
+        
+        Returns:
+            a list of (AOI id, number of Fixations, total duration) tuples
+        """
+        runs = []
+        for (code, start, count) in run_lengths(self.codes):
+            runs.append((self.aids[code], count, sum(self.durations[start:start + count])))
+        return runs
+
+    def to_list(self):
+        """Returns the sequence as a list of AOI ids
+        """
+        return map(lambda c: self.aids[c], self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return map(lambda c: self.aids[c], self.codes[i])
+        return self.aids[self.codes[i]]
+
+    def __eq__(self, other):
+        if isinstance(other, AOISequence):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return repr(self.to_list())
+
+    def __str__(self):
+        if params.AOI_SEQUENCE_FORMAT == 'rle':
+            return ';'.join(map(lambda (aid, count, duration): '%s,%d,%d' % (aid, count, duration), self.run_lengths()))
+        return repr(self.to_list())
+
+
+def get_active_aois(aois, start, end):
+    """Returns the "AOI"s of a list that are active during a time interval
+    
+    Args:
+        aois: a list of AOI objects
+        start: time interval start
+        end: time interval end
+    
+    Returns:
+        the list of the AOI objects of aois for which is_active(start, end) is True
+    """
+    return filter(lambda aoi: aoi.is_active(start, end), aois)
+
                    
 class AOI_Stat():
     """Methods of AOI_Stat calculate and store all features related to the given AOI object
     """
 
-    def __init__(self,aoi,seg_fixation_data, starttime, endtime, active_aois, seg_event_data=None):
+    def __init__(self,aoi,seg_fixation_data, starttime, endtime, active_aois, seg_event_data=None, membership=None, transitions=None,
+                 event_membership=None):
         """Inits AOI_Stat class
         
         Args:
@@ -130,6 +500,12 @@ class AOI_Stat():
             starttime:
             endtime:
             active_aois:list of the AOI objects that will be used for calculating the transitions between this AOI and other AOIs 
+            membership: if not None, the fixation x AOI membership matrix of seg_fixation_data for this AOI and the
+                active_aois, as returned by fixation_aoi_membership. It is calculated here if None
+            transitions: if not None, the AOITransitions of seg_fixation_data for this AOI and the active_aois.
+                It is calculated here if None or if the AOI is only active during part of the segment
+            event_membership: if not None, the clic x AOI membership matrix of seg_event_data for this AOI, as
+                returned by event_aoi_membership. It is calculated here if None
             
         Yields:
             an AOI_Stat object
@@ -141,14 +517,21 @@ class AOI_Stat():
             return
         self.isActive = True
         
+        if membership == None:
+            membership = fixation_aoi_membership(seg_fixation_data, [self.aoi] + active_aois)
+        if event_membership == None and seg_event_data != None:
+            event_membership = event_aoi_membership(EventArrays(seg_event_data), [self.aoi])
         if partition:
             if params.DEBUG:
                 print "partition",partition
             _,st,en = get_chunk(seg_fixation_data, 0, partition[0],partition[1])
             fixation_data = seg_fixation_data[st:en]
+            membership = dict(map(lambda (aid, inside): (aid, inside[st:en]), membership.iteritems()))
+            transitions = None
             if seg_event_data != None:
-                _,st,en = get_chunk(seg_event_data, 0, intr[0],intr[1])
-                event_data += seg_event_data[st:en]
+                _,st,en = get_chunk(seg_event_data, 0, partition[0],partition[1])
+                event_data = seg_event_data[st:en]
+                event_membership = {self.aoi.aid: event_membership[self.aoi.aid][st:en]}
             if params.DEBUG:
                 print "len(seg_fixation_data)",seg_fixation_data
                 print "len(fixation_data)",fixation_data
@@ -157,11 +540,13 @@ class AOI_Stat():
             if seg_event_data != None:
                 event_data = seg_event_data 
 
-        fixation_indices = filter(lambda i: _fixation_inside_aoi(fixation_data[i],self.aoi.polyin, self.aoi.polyout), range(len(fixation_data)))
+        fixation_inside = membership[self.aoi.aid]
+        fixation_indices = filter(lambda i: fixation_inside[i], range(len(fixation_data)))
         fixations = map(lambda i: fixation_data[i], fixation_indices)
 
         if seg_event_data != None:
-            event_indices = filter(lambda i: _event_inside_aoi(event_data[i],self.aoi.polyin, self.aoi.polyout), range(len(event_data)))
+            event_inside = event_membership[self.aoi.aid]
+            event_indices = filter(lambda i: event_inside[i], range(len(event_data)))
             events = map(lambda i: event_data[i], event_indices)
             (leftc, rightc, doublec, _) = generate_event_lists(events)
     
@@ -203,55 +588,63 @@ class AOI_Stat():
             self.features['timetofirstleftclic'] = leftc[0].timestamp - starttime if len(leftc) > 0 else -1
             self.features['timetofirstrightclic'] = rightc[0].timestamp - starttime if len(rightc) > 0 else -1
             self.features['timetofirstdoubleclic'] = doublec[0].timestamp - starttime if len(doublec) > 0 else -1
+
+        #a visit is a run of consecutive Fixations inside the AOI
+        self.visits = map(lambda (_, start, count): _visit(fixation_data[start], fixation_data[start + count - 1]),
+                          filter(lambda run: run[0], run_lengths(fixation_inside)))
+        set_visit_features(self.features, len(self.visits), sum(map(_visit_duration, self.visits)))
                 
 
         #calculating the transitions to and from this AOI and other active AOIs at the moment
-        for aoi in active_aois:
-            aid = aoi.aid
-            self.features['numtransto_%s'%(aid)] =0
-            self.features['numtransfrom_%s'%(aid)] = 0
-
-        sumtransto = 0
-        sumtransfrom = 0
-        for i in fixation_indices:
-            if i > 0:
-                for aoi in active_aois:
-                    aid = aoi.aid
-                    polyin = aoi.polyin
-                    polyout = aoi.polyout
-                    key = 'numtransfrom_%s'%(aid)
-                    #self.features[key] = 0 #????? Samad
-                    if _fixation_inside_aoi(fixation_data[i-1], polyin, polyout):
-                        self.features[key] += 1
-                        sumtransfrom += 1
-            if i < len(fixation_data)-2:
-                for aoi in active_aois:
-                    aid = aoi.aid
-                    polyin = aoi.polyin
-                    polyout = aoi.polyout
-                    key = 'numtransto_%s'%(aid)
-                    #self.features[key] = 0 #????? Samad
-                    if _fixation_inside_aoi(fixation_data[i+1], polyin, polyout):
-                        self.features[key] += 1
-                        sumtransto += 1
-
-        for aoi in active_aois:
-            aid = aoi.aid
-            if sumtransto > 0:
-                val = self.features['numtransto_%s'%(aid)]
-                self.features['proptransto_%s'%(aid)] = float(val) / sumtransto
+        self.transition_aids = map(lambda x: x.aid, active_aois)
+        if transitions == None:
+            transitions = AOITransitions(membership, [self.aoi.aid] + self.transition_aids)
+        self.transto = transitions.get_row(self.aoi.aid, self.transition_aids)
+        self.transfrom = transitions.get_column(self.aoi.aid, self.transition_aids)
+        self.set_transition_features()
+        ###endof trnsition calculation
+
+    def set_sample_features(self, gaze, sample_membership, starttime, endtime):
+        """Sets the numsamples and proportionsamples features from the valid gaze samples of the segment
+        
+        Only the samples of the part of the segment when the AOI is active are counted.
+        
+        Args:
+            gaze: the GazeArrays of the valid gaze samples of the segment
+            sample_membership: the sample x AOI membership matrix of gaze for this AOI, as returned by
+                sample_aoi_membership
+            starttime: the start of the segment
+            endtime: the end of the segment
+        """
+        sample_inside = sample_membership[self.aoi.aid]
+        _, partition = self.aoi.is_active_partition(starttime, endtime)
+        if partition:
+            st,en = gaze.get_range(partition[0],partition[1])
+            sample_inside = sample_inside[st:en]
+        numsamples = len(filter(None, sample_inside))
+        self.features['numsamples'] = numsamples
+        self.features['proportionsamples'] = float(numsamples)/len(sample_inside) if len(sample_inside) > 0 else 0
+
+    def set_transition_features(self):
+        """Sets the numtransto_, numtransfrom_, proptransto_ and proptransfrom_ features from the transition counts
+        
+        The counts are kept in the lists transto and transfrom, aligned with the list of AOI ids transition_aids.
+        The features are only a view of these lists for export.
+        """
+        self.total_tans_to = sum(self.transto)
+        self.total_tans_from = sum(self.transfrom)
+        for j in xrange(len(self.transition_aids)):
+            aid = self.transition_aids[j]
+            self.features['numtransto_%s'%(aid)] = self.transto[j]
+            self.features['numtransfrom_%s'%(aid)] = self.transfrom[j]
+            if self.total_tans_to > 0:
+                self.features['proptransto_%s'%(aid)] = float(self.transto[j]) / self.total_tans_to
             else:
                 self.features['proptransto_%s'%(aid)] = 0
-
-            if sumtransfrom > 0:
-                val = self.features['numtransfrom_%s'%(aid)]
-                self.features['proptransfrom_%s'%(aid)] = float(val) / sumtransfrom
+            if self.total_tans_from > 0:
+                self.features['proptransfrom_%s'%(aid)] = float(self.transfrom[j]) / self.total_tans_from
             else:
                 self.features['proptransfrom_%s'%(aid)] = 0
-        self.total_tans_to = sumtransto
-        self.total_tans_from = sumtransfrom
-        ###endof trnsition calculation
-
 
     def get_features(self, featurelist = None):
         """Returns the list of names and values of features for this AOI_Stat object
@@ -307,37 +700,789 @@ class AOI_Stat():
         print
             
 
-def _fixation_inside_aoi(fixation, polyin, polyout):
-    """Helper function that checks if a fixation object is inside the AOI described by external polygon polyin and the internal polygon polyout.
+def set_visit_features(features, numvisits, dwelltime):
+    """Sets the visit features of an AOI
+    
+    Args:
+        features: the dict of features of an AOI_Stat
+        numvisits: the number of visits to the AOI, a visit being a run of consecutive Fixations inside the AOI
+        dwelltime: the total duration of the visits, from the start of their first Fixation to the end of their last one
+    """
+    features['numvisits'] = numvisits
+    features['numrevisits'] = max(numvisits - 1, 0)
+    features['dwelltime'] = dwelltime
+    features['meanvisitduration'] = float(dwelltime) / numvisits if numvisits > 0 else 0
+
+def _visit(first, last):
+    """Helper function that returns a visit as a (first fixationindex, last fixationindex, start, end) tuple
+    
+    Args:
+        first: the first Fixation of the visit
+        last: the last Fixation of the visit
+    """
+    return (first.fixationindex, last.fixationindex, first.timestamp, last.timestamp + last.fixationduration)
+
+def _visit_duration(visit):
+    return visit[3] - visit[2]
+
+def _merge_visits(visits, other):
+    """Helper function that merges the visit summaries of two consecutive "Segment"s
+    
+    A visit summary is a [numvisits, dwelltime, first visit, last visit] list. The last visit of the first
+    Segment and the first visit of the second one are one visit if their Fixations are consecutive (or
+    the same Fixation, when it is included in both "Segment"s).
+    
+    Returns:
+        the merged visit summary
+    """
+    (num, dwell, first, last) = visits
+    (onum, odwell, ofirst, olast) = other
+    if onum == 0:
+        return list(visits)
+    if num == 0:
+        return list(other)
+    if last[1] is not None and ofirst[0] is not None and 0 <= ofirst[0] - last[1] <= 1:
+        joined = (last[0], ofirst[1], last[2], max(last[3], ofirst[3]))
+        dwell = dwell + odwell - _visit_duration(last) - _visit_duration(ofirst) + _visit_duration(joined)
+        return [num + onum - 1, dwell, joined if num == 1 else first, joined if onum == 1 else olast]
+    return [num + onum, dwell + odwell, first, olast]
+
+
+class Merged_AOI_Stat(AOI_Stat):
+    """An AOI_Stat object for a Scene that is built from a row of an AOIStatTable instead of from "Fixation"s
+    """
+
+    def __init__(self, aoi, features, transition_aids, transto, transfrom):
+        """Inits Merged_AOI_Stat class
+        
+        Args:
+            aoi: the aoi object for which the statistics are given
+            features: a dict with the features that are not transition features
+            transition_aids: a list of the ids of the "AOI"s with transition features
+            transto: a list of the number of transitions to each AOI in transition_aids
+            transfrom: a list of the number of transitions from each AOI in transition_aids
+            
+        Yields:
+            a Merged_AOI_Stat object
+        """
+        self.aoi = aoi
+        self.isActive = True
+        self.features = features
+        self.transition_aids = transition_aids
+        self.transto = transto
+        self.transfrom = transfrom
+        self.set_transition_features()
+
+
+AOI_STAT_SUMS = ['numfixations', 'totaltimespent', 'numevents', 'numleftclic', 'numrightclic', 'numdoubleclic']
+"""the AOI_Stat features that are added up when "Segment"s are merged, in the column order of AOIStatTable.sums"""
+
+AOI_STAT_FIRSTS = ['timetofirstfixation', 'timetolastfixation', 'timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic']
+"""the AOI_Stat features that are taken from the first merged Segment, in the column order of AOIStatTable.firsts"""
+
+
+class AOIStatTable():
+    """The AOI statistics of a Segment or Scene in a fixed numeric layout
+    
+    Row i of every table and column i of the transition tables belong to the AOI aids[i]. Merging the
+    tables of two "Segment"s only adds up (or takes the maximum of) the cells; the proportions and rates
+    are calculated once by get_aoistats when the AOI_Stat objects of a Scene are needed.
+    
+    Attributes:
+        aois: the list of "AOI"s of the table
+        aids: the list of AOI ids of the table
+        index: a dict with AOI ids as keys and row indices as values
+        present: a list of booleans indicating whether each AOI is active in one of the merged "Segment"s
+        has_events: a list of booleans indicating whether each AOI has event features
+        sums: an AOI x AOI_STAT_SUMS table of the features that are added up
+        longest: a list of the longest fixation in each AOI
+        firsts: a list with, for each AOI, None or the AOI_STAT_FIRSTS features from the first merged Segment
+        visits: a list with, for each AOI, the [numvisits, dwelltime, first visit, last visit] summary of its
+            visits, so that a visit that goes on from one Segment to the next is counted once
+        transto: an AOI x AOI table, transto[i][j] is the number of transitions from AOI i to AOI j
+        transfrom: an AOI x AOI table, transfrom[i][j] is the number of transitions to AOI i from AOI j
+        transpairs: an AOI x AOI table of booleans indicating whether AOI j was active together with AOI i
+    """
+
+    def __init__(self, aois):
+        """Inits AOIStatTable class with all cells set to zero
+        
+        Args:
+            aois: a list of "AOI"s
+            
+        Yields:
+            an AOIStatTable object
+        """
+        self.aois = list(aois)
+        self.aids = map(lambda x: x.aid, self.aois)
+        self.index = dict(zip(self.aids, xrange(len(self.aids))))
+        n = len(self.aids)
+        self.present = [False] * n
+        self.has_events = [False] * n
+        self.sums = map(lambda x: [0] * len(AOI_STAT_SUMS), xrange(n))
+        self.longest = [0] * n
+        self.firsts = [None] * n
+        self.visits = map(lambda x: [0, 0, None, None], xrange(n))
+        self.transto = map(lambda x: [0] * n, xrange(n))
+        self.transfrom = map(lambda x: [0] * n, xrange(n))
+        self.transpairs = map(lambda x: [False] * n, xrange(n))
+
+    def add_aoistats(self, aoistats):
+        """Sets the rows of the active AOI_Stat objects of a Segment
+        
+        Args:
+            aoistats: a dict with AOI ids as keys and AOI_Stat objects as values
+        
+        Returns:
+            this AOIStatTable object
+        """
+        for aid, stat in aoistats.iteritems():
+            if not stat.isActive:
+                continue
+            r = self.index[aid]
+            self.present[r] = True
+            self.has_events[r] = 'numevents' in stat.features
+            self.sums[r] = map(lambda x: stat.features.get(x, 0), AOI_STAT_SUMS)
+            self.longest[r] = stat.features['longestfixation']
+            self.firsts[r] = map(lambda x: stat.features.get(x), AOI_STAT_FIRSTS)
+            self.visits[r] = [len(stat.visits), stat.features['dwelltime'],
+                              stat.visits[0] if stat.visits else None, stat.visits[-1] if stat.visits else None]
+            for j in xrange(len(stat.transition_aids)):
+                c = self.index[stat.transition_aids[j]]
+                self.transpairs[r][c] = True
+                self.transto[r][c] = stat.transto[j]
+                self.transfrom[r][c] = stat.transfrom[j]
+        return self
+
+    def merge(self, other):
+        """Adds the statistics of the AOIStatTable of a following Segment to this table
+        
+        Args:
+            other: an AOIStatTable whose AOI ids are all in this table
+        
+        Returns:
+            this AOIStatTable object
+        """
+        if other.aids == self.aids:
+            cols = range(len(self.aids))
+        else:
+            cols = map(lambda x: self.index[x], other.aids)
+        n = len(cols)
+        for i in xrange(n):
+            if not other.present[i]:
+                continue
+            r = cols[i]
+            if self.present[r]:
+                row = self.sums[r]
+                orow = other.sums[i]
+                for k in xrange(len(row)):
+                    row[k] += orow[k]
+                if other.longest[i] > self.longest[r]:
+                    self.longest[r] = other.longest[i]
+                self.visits[r] = _merge_visits(self.visits[r], other.visits[i])
+            else:
+                self.present[r] = True
+                self.has_events[r] = other.has_events[i]
+                self.sums[r] = list(other.sums[i])
+                self.longest[r] = other.longest[i]
+                self.firsts[r] = other.firsts[i]
+                self.visits[r] = list(other.visits[i])
+            pairs, opairs = self.transpairs[r], other.transpairs[i]
+            to, oto = self.transto[r], other.transto[i]
+            fr, ofr = self.transfrom[r], other.transfrom[i]
+            for j in xrange(n):
+                if opairs[j]:
+                    c = cols[j]
+                    pairs[c] = True
+                    to[c] += oto[j]
+                    fr[c] += ofr[j]
+        return self
+
+    def get_aoistats(self, length, numfixations):
+        """Returns the AOI_Stat objects for the AOIs that are active in the merged "Segment"s
+        
+        Args:
+            length: the total length of the merged "Segment"s in milliseconds
+            numfixations: the total number of "Fixation"s in the merged "Segment"s
+        
+        Returns:
+            a dict with AOI ids as keys and Merged_AOI_Stat objects as values
+        """
+        aoistats = {}
+        for r in xrange(len(self.aids)):
+            if not self.present[r]:
+                continue
+            numfix, totaltime, numevents, numleftc, numrightc, numdoublec = self.sums[r]
+            features = {}
+            features['numfixations'] = numfix
+            features['longestfixation'] = self.longest[r]
+            features['totaltimespent'] = totaltime
+            features['proportiontime'] = float(totaltime)/length
+            features['proportionnum'] = float(numfix)/numfixations
+            features['fixationrate'] = float(numfix)/totaltime if totaltime > 0 else 0.0
+            features['timetofirstfixation'] = self.firsts[r][0]
+            features['timetolastfixation'] = self.firsts[r][1]
+            set_visit_features(features, self.visits[r][0], self.visits[r][1])
+            if self.has_events[r]:
+                features['numevents'] = numevents
+                features['numleftclic'] = numleftc
+                features['numrightclic'] = numrightc
+                features['numdoubleclic'] = numdoublec
+                features['leftclicrate'] = float(numleftc)/length
+                features['rightclicrate'] = float(numrightc)/length
+                features['doubleclicrate'] = float(numdoublec)/length
+                features['timetofirstleftclic'] = self.firsts[r][2]
+                features['timetofirstrightclic'] = self.firsts[r][3]
+                features['timetofirstdoubleclic'] = self.firsts[r][4]
+            cols = filter(lambda c: self.transpairs[r][c], xrange(len(self.aids)))
+            aoistats[self.aids[r]] = Merged_AOI_Stat(self.aois[r], features,
+                                                     map(lambda c: self.aids[c], cols),
+                                                     map(lambda c: self.transto[r][c], cols),
+                                                     map(lambda c: self.transfrom[r][c], cols))
+        return aoistats
+
+
+class AOITransitions():
+    """The transitions between "AOI"s in a sequence of "Fixation"s as one AOI x AOI matrix
     
-    Fixation object is inside AOI if it is inside polyin but outside polyout
+    Each Fixation gets a label, the set of AOIs it is inside encoded as a bit mask. The consecutive label
+    pairs are counted in one pass and every distinct pair is then added to the cells of the AOIs it
+    contains, so the cost is one pass over the "Fixation"s plus the number of distinct label pairs.
+    
+    The matrix of a Scene is the sum of the matrices of its "Segment"s (see merge), and the Markov
+    chain features (stationary distribution, entropies and self-transition rate) are calculated from
+    the counts, so they are never recounted from the "Fixation"s.
+    
+    Attributes:
+        aids: the list of AOI ids; row and column i belong to aids[i]
+        index: a dict with AOI ids as keys and row indices as values
+        counts: an AOI x AOI matrix, counts[i][j] is the number of consecutive "Fixation"s where the first
+            one is inside aids[i] and the second one is inside aids[j]
+    """
+
+    def __init__(self, membership, aids):
+        """Inits AOITransitions class
+        
+        Args:
+            membership: a fixation x AOI membership matrix, as returned by fixation_aoi_membership, or
+                None for a matrix with no transitions
+            aids: a list of the AOI ids of the matrix, all of them in membership
+            
+        Yields:
+            an AOITransitions object
+        """
+        self.aids = []
+        for aid in aids:
+            if aid not in self.aids:
+                self.aids.append(aid)
+        self.index = dict(zip(self.aids, xrange(len(self.aids))))
+        n = len(self.aids)
+        self.counts = map(lambda x: [0] * n, xrange(n))
+        if n == 0 or membership is None:
+            return
+        labels = [0] * len(membership[self.aids[0]])
+        for r in xrange(n):
+            bit = 1 << r
+            inside = membership[self.aids[r]]
+            for k in xrange(len(labels)):
+                if inside[k]:
+                    labels[k] |= bit
+        pairs = {}
+        for k in xrange(1, len(labels)):
+            if labels[k-1] and labels[k]:
+                pair = (labels[k-1], labels[k])
+                pairs[pair] = pairs.get(pair, 0) + 1
+        rows = {}
+        for (first, second), count in pairs.iteritems():
+            for label in (first, second):
+                if label not in rows:
+                    rows[label] = filter(lambda r: label & (1 << r), xrange(n))
+            for i in rows[first]:
+                row = self.counts[i]
+                for j in rows[second]:
+                    row[j] += count
+
+    def get_row(self, aid, aids):
+        """Returns the number of transitions from an AOI to each AOI of a list
+        """
+        row = self.counts[self.index[aid]]
+        return map(lambda x: row[self.index[x]], aids)
+
+    def get_column(self, aid, aids):
+        """Returns the number of transitions to an AOI from each AOI of a list
+        """
+        c = self.index[aid]
+        return map(lambda x: self.counts[self.index[x]][c], aids)
+
+    def merge(self, other):
+        """Adds the transitions of the AOITransitions of another Segment to this matrix
+        
+        Args:
+            other: an AOITransitions whose AOI ids are all in this matrix
+        
+        Returns:
+            this AOITransitions object
+        """
+        cols = map(lambda x: self.index[x], other.aids)
+        for i in xrange(len(cols)):
+            row = self.counts[cols[i]]
+            orow = other.counts[i]
+            for j in xrange(len(cols)):
+                row[cols[j]] += orow[j]
+        return self
+
+    def get_total(self):
+        """Returns the total number of transitions in the matrix
+        """
+        return sum(map(sum, self.counts))
+
+    def get_stationary_distribution(self):
+        """Returns the stationary distribution of the AOI Markov chain, aligned with aids
+        
+        The distribution is estimated as the proportion of the transitions that start in each AOI, which
+        only depends on the counts and is therefore the same for a Scene as for its merged "Segment"s.
+        All the probabilities are 0 if there are no transitions.
+        """
+        total = self.get_total()
+        if total == 0:
+            return [0.0] * len(self.aids)
+        return map(lambda row: float(sum(row)) / total, self.counts)
+
+    def get_stationary_entropy(self):
+        """Returns the entropy (in bits) of the stationary distribution of the AOI Markov chain
+        """
+        return _entropy(self.get_stationary_distribution())
+
+    def get_transition_entropy(self):
+        """Returns the entropy (in bits) of the transitions of the AOI Markov chain
+        
+        This is the entropy of the transition probabilities from each AOI, weighted by the stationary
+        distribution (Krejtz et al., 2015).
+        """
+        total = self.get_total()
+        if total == 0:
+            return 0.0
+        entropy = 0.0
+        for row in self.counts:
+            rowtotal = sum(row)
+            if rowtotal > 0:
+                entropy += rowtotal * _entropy(map(lambda x: float(x) / rowtotal, row))
+        return entropy / total
+
+    def get_self_transition_rate(self):
+        """Returns the proportion of the transitions that stay in the same AOI, or 0 if there are none
+        """
+        total = self.get_total()
+        if total == 0:
+            return 0.0
+        return float(sum(map(lambda i: self.counts[i][i], xrange(len(self.aids))))) / total
+
+
+def _entropy(probabilities):
+    """Returns the entropy in bits of a discrete distribution given as a list of probabilities
+    """
+    return -sum(map(lambda p: p * math.log(p, 2), filter(lambda p: p > 0, probabilities)))
+
+
+class AOIGrid():
+    """Spatial index of a list of AOIs over the screen coordinates
+    
+    The screen is split in a uniform grid of square cells and every cell lists the AOIs whose bounding
+    box overlaps it. A point is then only tested against the polygons of the AOIs listed for
+    its cell, so the cost of a hit-test stays roughly the same as the number of AOIs grows.
+    
+    Attributes:
+        aois: the list of AOI objects in the index
+        cellsize: the width and height of a cell in pixels
+        cells: a dict with (column, row) tuples as keys and lists of indices in aois as values
+    """
+    def __init__(self, aois, cellsize = None):
+        """Inits AOIGrid class
+        
+        Args:
+            aois: a list of AOI objects
+            cellsize: the width and height of a cell in pixels, params.AOI_GRID_CELL_SIZE if None
+        """
+        self.aois = list(aois)
+        self.cellsize = float(cellsize if cellsize else params.AOI_GRID_CELL_SIZE)
+        self.cells = {}
+        for r, aoi in enumerate(self.aois):
+            box = aoi.get_bounding_box()
+            if box is None:
+                continue
+            (minx, miny, maxx, maxy) = box
+            for cx in xrange(self._cell(minx), self._cell(maxx) + 1):
+                for cy in xrange(self._cell(miny), self._cell(maxy) + 1):
+                    self.cells.setdefault((cx, cy), []).append(r)
+
+    def _cell(self, v):
+        return int(math.floor(v / self.cellsize))
+
+    def candidates(self, x, y):
+        """Returns the indices in aois of the AOIs whose bounding box may contain the point (x, y)
+        """
+        if x is None or y is None:
+            return []
+        return self.cells.get((self._cell(x), self._cell(y)), [])
+
+    def hit_test(self, xs, ys, ts = None):
+        """Determines for a batch of points which ones are inside each AOI of the index
+        
+        Args:
+            xs: a list of the x coordinates of the points
+            ys: a list of the y coordinates of the points
+            ts: optional list of the timestamps of the points, needed for "MovingAOI"s
+        
+        Returns:
+            a list with, for each AOI of aois, a list of booleans for whether each point is inside the AOI
+        """
+        candidates = map(lambda aoi: [], self.aois)
+        for i in xrange(len(xs)):
+            for r in self.candidates(xs[i], ys[i]):
+                candidates[r].append(i)
+        masks = []
+        for r, aoi in enumerate(self.aois):
+            mask = [False] * len(xs)
+            indices = candidates[r]
+            if indices:
+                inside = aoi.contains_points(map(lambda i: xs[i], indices), map(lambda i: ys[i], indices),
+                                             map(lambda i: ts[i], indices) if ts is not None else None)
+                for i, point_inside in zip(indices, inside):
+                    mask[i] = point_inside
+            masks.append(mask)
+        return masks
+
+_aoi_grids = {}
+"""AOIGrid objects of the AOI lists seen so far, keyed by the ids of the AOI objects"""
+
+def get_aoi_grid(aois):
+    """Returns the AOIGrid of a list of AOIs, building it only the first time the list is seen
+    
+    All the Segments of a Recording share the same AOI list, so the grid is built once per Recording.
+    
+    Args:
+        aois: a list of AOI objects
+    
+    Returns:
+        an AOIGrid object
+    """
+    key = tuple(map(id, aois))
+    if key not in _aoi_grids:
+        if len(_aoi_grids) >= 32:
+            _aoi_grids.clear()
+        _aoi_grids[key] = AOIGrid(aois)
+    return _aoi_grids[key]
+
+class AOILabelMap():
+    """Raster of a list of static AOIs over the pixels of the screen
+    
+    Every pixel holds a bitset of the AOIs that contain it, with bit r for the AOI at index r of aois, so
+    overlapping AOIs are supported. The bitsets are stored in arrays of unsigned integers of up to 32
+    bits (words), one array per 32 AOIs. A point with integer coordinates on the screen (ints, or floats
+    with an integer value) is hit-tested with one lookup per word; the other points are tested against the
+    polygons. Points with fractional coordinates, e.g., the gaze samples of SMI recordings, are not rounded
+    to a pixel since that could move them across the boundary of an AOI.
+    
+    Attributes:
+        aois: the list of AOI objects in the map
+        width: the width of the screen in pixels
+        height: the height of the screen in pixels
+        words: a list of arrays of width x height bitsets, in row order
+    """
+    def __init__(self, aois, width, height, words = None):
+        """Inits AOILabelMap class
+        
+        Args:
+            aois: a list of static AOI objects
+            width: an integer, the width of the screen in pixels
+            height: an integer, the height of the screen in pixels
+            words: the arrays of bitsets of a previously rasterized map of the same AOIs, if not None
+        """
+        self.aois = list(aois)
+        self.width = width
+        self.height = height
+        self.words = words if words is not None else self._rasterize()
+
+    def _rasterize(self):
+        words = []
+        for first in xrange(0, len(self.aois), 32):
+            count = min(32, len(self.aois) - first)
+            typecode = 'B' if count <= 8 else 'H' if count <= 16 else 'L'
+            word = array(typecode, [0]) * (self.width * self.height)
+            for r in xrange(first, first + count):
+                aoi = self.aois[r]
+                bit = 1 << (r - first)
+                for polyin in aoi.polyins:
+                    for y, spans in enumerate(polygon_spans(polyin, self.width, self.height)):
+                        row = y * self.width
+                        for (start, end) in spans:
+                            for i in xrange(row + start, row + end):
+                                word[i] |= bit
+                for polyout in aoi.polyouts:
+                    for y, spans in enumerate(polygon_spans(polyout, self.width, self.height)):
+                        row = y * self.width
+                        for (start, end) in spans:
+                            for i in xrange(row + start, row + end):
+                                word[i] &= ~bit
+            words.append(word)
+        return words
+
+    def hit_test(self, xs, ys):
+        """Determines for a batch of points which ones are inside each AOI of the map
+        
+        Args:
+            xs: a list of the x coordinates of the points
+            ys: a list of the y coordinates of the points
+        
+        Returns:
+            a list with, for each AOI of aois, a list of booleans for whether each point is inside the AOI
+        """
+        masks = map(lambda aoi: [False] * len(xs), self.aois)
+        bits = dict(map(lambda b: (1 << b, b), xrange(32)))
+        outside = []
+        for i in xrange(len(xs)):
+            x, y = xs[i], ys[i]
+            if type(x) is float and x.is_integer():
+                x = int(x)
+            if type(y) is float and y.is_integer():
+                y = int(y)
+            if not (type(x) in (int, long) and type(y) in (int, long) and 0 <= x < self.width and 0 <= y < self.height):
+                outside.append(i)
+                continue
+            pixel = y * self.width + x
+            for w, word in enumerate(self.words):
+                labels = word[pixel]
+                while labels:
+                    bit = labels & -labels
+                    masks[w * 32 + bits[bit]][i] = True
+                    labels ^= bit
+        if outside:
+            for r, aoi in enumerate(self.aois):
+                inside = aoi.contains_points(map(lambda i: xs[i], outside), map(lambda i: ys[i], outside))
+                for i, point_inside in zip(outside, inside):
+                    masks[r][i] = point_inside
+        return masks
+
+_aoi_label_maps = {}
+"""AOILabelMap objects of the AOI lists seen so far, keyed by the ids of the AOI objects"""
+
+def get_aoi_label_map(aois):
+    """Returns the AOILabelMap of a list of static AOIs on a screen of params.SCREEN_RESOLUTION
+    
+    The map is rasterized only the first time the AOIs are seen: it is kept in memory for the process and,
+    if params.AOI_LABEL_MAP_FOLDER is not None, saved in a file named after the geometry of the AOIs so
+    the other participants and processes using the same AOI file load it instead.
+    
+    Args:
+        aois: a list of AOI objects without time intervals
+    
+    Returns:
+        an AOILabelMap object
+    """
+    key = tuple(map(id, aois))
+    if key in _aoi_label_maps:
+        return _aoi_label_maps[key]
+    width, height = params.SCREEN_RESOLUTION
+    labelmap = None
+    filename = None
+    if params.AOI_LABEL_MAP_FOLDER is not None:
+        geometry = repr((width, height, map(lambda aoi: (aoi.aid, aoi.polyins, aoi.polyouts), aois)))
+        filename = os.path.join(params.AOI_LABEL_MAP_FOLDER, hashlib.md5(geometry).hexdigest() + '.aoimap')
+        if os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                labelmap = AOILabelMap(aois, width, height, cPickle.load(f))
+    if labelmap is None:
+        labelmap = AOILabelMap(aois, width, height)
+        if filename is not None:
+            if not os.path.exists(params.AOI_LABEL_MAP_FOLDER):
+                try:
+                    os.makedirs(params.AOI_LABEL_MAP_FOLDER)
+                except OSError:  #created by another process in the meantime
+                    pass
+            tmpname = '%s.%d.tmp' % (filename, os.getpid())
+            with open(tmpname, 'wb') as f:
+                cPickle.dump(labelmap.words, f, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmpname, filename)
+    if len(_aoi_label_maps) >= 32:
+        _aoi_label_maps.clear()
+    _aoi_label_maps[key] = labelmap
+    return labelmap
+
+def aoi_hit_test(xs, ys, aois, ts = None):
+    """Determines for a batch of points which ones are inside each AOI of a list
+    
+    If params.AOI_LABEL_MAP is True, the points are looked up in the AOILabelMap of the AOIs without time
+    intervals that do not move. The other AOIs are tested through their AOIGrid if there are at least params.AOI_GRID_MIN_AOIS
+    of them, and one by one otherwise. All give the same result.
+    
+    Args:
+        xs: a list of the x coordinates of the points
+        ys: a list of the y coordinates of the points
+        aois: a list of AOI objects with unique ids
+        ts: optional list of the timestamps of the points, needed for "MovingAOI"s
+    
+    Returns:
+        a list with, for each AOI of aois, a list of booleans for whether each point is inside the AOI
+    """
+    if params.AOI_LABEL_MAP:
+        is_static = lambda aoi: not aoi.timeseq and not isinstance(aoi, MovingAOI)
+        static_aois = filter(is_static, aois)
+        if static_aois:
+            other_aois = filter(lambda aoi: not is_static(aoi), aois)
+            masks = dict(zip(map(id, static_aois), get_aoi_label_map(static_aois).hit_test(xs, ys)))
+            if other_aois:
+                masks.update(zip(map(id, other_aois), _aoi_hit_test(xs, ys, other_aois, ts)))
+            return map(lambda aoi: masks[id(aoi)], aois)
+    return _aoi_hit_test(xs, ys, aois, ts)
+
+def _aoi_hit_test(xs, ys, aois, ts):
+    """Helper function of aoi_hit_test that tests the points against the polygons of the AOIs
+    """
+    if params.AOI_GRID_MIN_AOIS is not None and len(aois) >= params.AOI_GRID_MIN_AOIS:
+        return get_aoi_grid(aois).hit_test(xs, ys, ts)
+    return map(lambda aoi: aoi.contains_points(xs, ys, ts), aois)
+
+def fixation_aoi_membership(fixations, aois):
+    """Returns the fixation x AOI membership matrix of a list of "Fixation"s
+    
+    The matrix is computed once per Segment and read by the AOI features, the transitions and the AOI
+    sequence instead of testing the same Fixation against the same AOI again. Membership only depends on
+    the polygons of an AOI, not on whether the AOI is active. The Fixations are hit-tested with aoi_hit_test,
+    "MovingAOI"s at the timestamp of each Fixation.
+    
+    Args:
+        fixations: A list of Fixation objects
+        aois: A list of AOI objects
+    
+    Returns:
+        A dict with AOI ids as keys and, as values, lists of booleans for whether each Fixation is inside the AOI
+    """
+    unique_aois = _unique_aois(aois)
+    masks = aoi_hit_test(map(lambda x: x.mappedfixationpointx, fixations),
+                         map(lambda x: x.mappedfixationpointy, fixations), unique_aois,
+                         map(lambda x: x.timestamp, fixations))
+    return dict(zip(map(lambda aoi: aoi.aid, unique_aois), masks))
+
+def event_aoi_membership(events, aois):
+    """Returns the clic x AOI membership matrix of the "Event"s of a Segment
+    
+    The mouse clics of all the AOIs are hit-tested in one batch with aoi_hit_test.
+    
+    Args:
+        events: an EventArrays object
+        aois: A list of AOI objects
+    
+    Returns:
+        A dict with AOI ids as keys and, as values, lists of booleans for whether each Event is a mouse clic
+        inside the AOI
+    """
+    unique_aois = _unique_aois(aois)
+    clics = events.get_clics()
+    masks = aoi_hit_test(map(lambda i: events.xs[i], clics), map(lambda i: events.ys[i], clics), unique_aois,
+                         map(lambda i: events.timestamps[i], clics))
+    membership = {}
+    for aoi, clics_inside in zip(unique_aois, masks):
+        inside = [False] * len(events)
+        for i, clic_inside in zip(clics, clics_inside):
+            inside[i] = clic_inside
+        membership[aoi.aid] = inside
+    return membership
+
+def sample_aoi_membership(gaze, aois):
+    """Returns the gaze sample x AOI membership matrix of the valid samples of a Segment
+    
+    All the samples are hit-tested in one batch with aoi_hit_test, so they go through the same AOI grid
+    or label map as the "Fixation"s.
+    
+    Args:
+        gaze: a GazeArrays object
+        aois: A list of AOI objects
+    
+    Returns:
+        A dict with AOI ids as keys and, as values, lists of booleans for whether each sample is inside the AOI
+    """
+    unique_aois = _unique_aois(aois)
+    masks = aoi_hit_test(gaze.xs, gaze.ys, unique_aois, gaze.timestamps)
+    return dict(zip(map(lambda aoi: aoi.aid, unique_aois), masks))
+
+def _unique_aois(aois):
+    """Helper function that returns the "AOI"s of a list without the repeated AOI ids
+    """
+    unique_aois = []
+    seen = set()
+    for aoi in aois:
+        if aoi.aid not in seen:
+            seen.add(aoi.aid)
+            unique_aois.append(aoi)
+    return unique_aois
+
+def _polygon_list(polygons):
+    """Helper function that returns a polygon, or a list of polygons, as a list of polygons
+    
+    Args:
+        polygons: a list of (x,y) tuples, a list of such lists, or an empty list
+    
+    Returns:
+        a list of polygons, each a list of (x,y) tuples
+    """
+    if not polygons:
+        return []
+    first = polygons[0]
+    if not first or isinstance(first[0], (tuple, list)):
+        return filter(lambda poly: poly, polygons)
+    return [polygons]
+
+def _bounding_box(polygons):
+    """Helper function that returns the (minx, miny, maxx, maxy) bounding box of a list of polygons, or None if they have no vertices
+    """
+    points = reduce(lambda points, poly: points + list(poly), polygons, [])
+    if not points:
+        return None
+    xs = map(lambda p: p[0], points)
+    ys = map(lambda p: p[1], points)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def _interpolate_polygons(polygons0, polygons1, f):
+    """Helper function that returns the polygons at fraction f of the way from polygons0 to polygons1
+    
+    Args:
+        polygons0: a list of polygons, each a list of (x,y) tuples
+        polygons1: a list of polygons with the same number of vertices as polygons0
+        f: a float between 0 and 1
+    
+    Returns:
+        a list of polygons
+    """
+    return map(lambda (poly0, poly1): map(lambda ((x0, y0), (x1, y1)): (x0 + (x1 - x0) * f, y0 + (y1 - y0) * f), zip(poly0, poly1)),
+               zip(polygons0, polygons1))
+
+def _fixation_inside_aoi(fixation, aoi):
+    """Helper function that checks if a fixation object is inside an AOI.
+    
+    Fixation object is inside AOI if it is inside one of its polyins but outside all of its polyouts
     
     Args:
         fixation: A Fixation object
-        polyin: the external polygon in form of a list of (x,y) tuples
-        polyout: the internal polygon in form of a list of (x,y) tuples
+        aoi: An AOI object
     
     Returns: 
         A boolean for whether the Fixation is inside the AOI or not
     """
-    return point_inside_polygon(fixation.mappedfixationpointx,
-    fixation.mappedfixationpointy, polyin) and not point_inside_polygon(fixation.mappedfixationpointx,
-    fixation.mappedfixationpointy, polyout)     
-         
-def _event_inside_aoi(event, polyin, polyout):
-    """Helper function that checks if an event (mouse clic) object is inside the AOI described by external polygon polyin and the internal polygon polyout.
+    return aoi.contains_points([fixation.mappedfixationpointx], [fixation.mappedfixationpointy], [fixation.timestamp])[0]
+
+def _event_inside_aoi(event, aoi):
+    """Helper function that checks if an event (mouse clic) object is inside an AOI.
     
-    Event object is inside AOI if it is inside polyin but outside polyout
+    Event object is inside AOI if it is inside one of its polyins but outside all of its polyouts
     
     Args:
         event: An Event object
-        polyin: the external polygon in form of a list of (x,y) tuples
-        polyout: the internal polygon in form of a list of (x,y) tuples
+        aoi: An AOI object
     
     Returns: 
         A boolean for whether the Fixation is inside the AOI or not
     """
     if event.event == "LeftMouseClick" or event.event == "RightMouseClick": #keep only mouse clics
-        return point_inside_polygon(event.data1, event.data2, polyin) and not point_inside_polygon(event.data1, event.data2, polyout)     
+        return aoi.contains_points([event.data1], [event.data2], [event.timestamp])[0]
     else:
-        return False
\ No newline at end of file
+        return False
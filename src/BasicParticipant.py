@@ -84,14 +84,12 @@ class BasicParticipant(Participant):
         self.features['numofsegments']= self.numofsegments
         
         self.segments, self.scenes = rec.process_rec(scenelist = scenelist,aoilist = aois,prune_length = prune_length, require_valid_segs = require_valid_segs, 
-                                                     auto_partition_low_quality_segments = auto_partition_low_quality_segments, rpsdata = rpsdata, export_pupilinfo=export_pupilinfo)
+                                                     auto_partition_low_quality_segments = auto_partition_low_quality_segments, rpsdata = rpsdata, export_pupilinfo=export_pupilinfo,
+                                                     processes = params.SCENE_PROCESSES, feature_groups = params.SCENE_FEATURE_GROUPS)
         Segments = self.segments
         self.whole_scene = Scene('P'+str(pid),[],rec.all_data,rec.fix_data, event_data = rec.event_data, Segments = self.segments, aoilist = aois,prune_length = prune_length, require_valid = require_valid_segs, export_pupilinfo=export_pupilinfo )
         self.scenes.insert(0,self.whole_scene)
 
-        for sc in self.scenes:
-            sc.clean_memory()
-
                
 def read_participants_Basic(datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets=None, 
                           require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None):
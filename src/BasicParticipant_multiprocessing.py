@@ -8,13 +8,16 @@ Last version: 2014-09-16
 
 from data_structures import *
 import Recording
+from tobii import TobiiRecording
+from smi import SMIRecording
 params=__import__('params')
 from Participant import *
 from AOI import AOI
 from Scene import Scene
 from utils import *
 from math import ceil, floor
-from multiprocessing import Process, Queue
+from multiprocessing import Pool
+import os.path
 
 
 class BasicParticipant(Participant):
@@ -66,13 +69,19 @@ class BasicParticipant(Participant):
         
         print "reading the files"
         self.features={}
-        rec = Recording.Recording(datafile, fixfile, event_file=eventfile, media_offset=params.MEDIA_OFFSET)
+        if params.EYETRACKERTYPE == "Tobii":
+            rec = TobiiRecording(datafile, fixfile, event_file=eventfile, media_offset=params.MEDIA_OFFSET)
+        elif params.EYETRACKERTYPE == "SMI":
+            rec = SMIRecording(datafile, fixfile, event_file=eventfile, media_offset=params.MEDIA_OFFSET)
+        else:
+            raise Exception("Unknown eye tracker type.")
+
         print "Done!"
         
         scenelist,self.numofsegments = partition_Basic(segfile)
         print "partition done!"
         if aoifile != None:
-            aois = Recording.read_aois_Tobii(aoifile)
+            aois = Recording.read_aois(aoifile)
         else:
             aois = None
         
@@ -84,40 +93,14 @@ class BasicParticipant(Participant):
         self.whole_scene = Scene('P'+str(pid),[],rec.all_data,rec.fix_data, event_data = rec.event_data, Segments = self.segments, aoilist = aois,prune_length = prune_length, require_valid = require_valid_segs, export_pupilinfo=export_pupilinfo )
         self.scenes.insert(0,self.whole_scene)
 
-        for sc in self.scenes:
-            sc.clean_memory()
-
-def chunks(l, n):
-    """Split a list in balanced sub-lists. If equal sublits are not possible, remaining elements are distribute evenly among sublists.
-    
-    Args:
-        l: the list to split.
-		
-        n: the number of sublists to generate.
-        
-    Returns:
-        a list of n sublists
-    """
-    if n < 1:
-        n = 1
-    if len(l) < n:
-        n = len(l)
-		
-    nsize = len(l)/n #number of elements in the sublists
-    if len(l)%n == 0:
-        return [l[i:i + nsize] for i in range(0, len(l), nsize)]
-    else:
-        l2 = [l[i:i + nsize] for i in range(0, len(l[0:nsize*n]), nsize)]
-        i=0
-        for j in l[nsize*n:len(l)]: #distribute remaining elements
-            l2[i].append(j)
-            i = (i+1) % n
-        return l2
-
 def read_participants_Basic_multiprocessing(nbprocesses, datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets=None, 
-                          require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None, export_pupilinfo = False):
+                          require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None, export_pupilinfo = False,
+                          compact_features = None):
     """Generates list of Participant objects in parallel computing. Relevant information is read from input files
     
+    The participants are handed out one at a time to a pool of processes, largest input files first, so a
+    long recording does not hold back a fixed share of the other participants while the other processes are idle.
+    
     Args:
         nbprocesses: number of processes to run in parallel (number of CPU cores is a good option).
 		
@@ -152,124 +135,132 @@ def read_participants_Basic_multiprocessing(nbprocesses, datadir, user_list, pid
         rpsfile: If not None, a string containing the name of the '.tsv' file 
             with rest pupil sizes for all scenes and for each user. 
         
+        compact_features: If not None, a dict with the featurelist, aoifeaturelist and/or aoifeaturelabels
+            to export, or a list of such dicts for several exports (e.g., the features and then the AOI
+            sequences). The processes then calculate these features and only send back a ParticipantFeatures
+            object per participant instead of the whole Participant, which can be passed to
+            export_features_all and write_features_tsv with the feature lists of any of these exports.
+            A ParticipantFeatures object keeps the validity of the participant and of its "Scene"s, so
+            is_valid can be used with any threshold, but not the "Segment"s: the Segment-level validity
+            reports (e.g., of ValidityProcessing) need the whole Participant objects.
+        
     Returns:
-        a list Participant objects
+        a list Participant objects (or ParticipantFeatures objects), in the order of user_list
     """
-    
-    q = Queue() 
-    listprocess = []
     participants = []
+    tasks = get_participant_tasks(datadir, user_list, pids, prune_length, aoifile, log_time_offsets,
+                                  require_valid_segs, auto_partition_low_quality_segments, rpsfile, export_pupilinfo)
+    if isinstance(compact_features, dict):
+        compact_features = [compact_features]
+    tasks = map(lambda task: task + (compact_features,), tasks)
+    if not tasks:
+        return participants
+    tasks.sort(key = lambda task: get_input_size(task[1]), reverse = True)  #longest first
 	
     if nbprocesses < 1:
         nbprocesses = 1
-    if nbprocesses > len(user_list):
-        nbprocesses = len(user_list)
-	
-    for i in range(0, nbprocesses): #create a sublist of participants for each process
-        user_listsplit = chunks(user_list, nbprocesses)
-        pidssplit = chunks(pids, nbprocesses)
-	
-    print user_listsplit
+    if nbprocesses > len(tasks):
+        nbprocesses = len(tasks)
+
+    results = {}
+    pool = Pool(nbprocesses)
     try:
-        for i in range(0, nbprocesses):
-            p = Process(target=read_participants_Basic, args=(q, datadir, user_listsplit[i], pidssplit[i], prune_length, aoifile, log_time_offsets, 
-                          require_valid_segs, auto_partition_low_quality_segments, rpsfile, export_pupilinfo))
-            listprocess.append(p)
-            p.start() # start the process
-	
-        for i in range(0, nbprocesses):
-            participants = participants + q.get(True) # wait for the results of all processes
-		
-        for pr in listprocess:
-            pr.terminate()
-            pr.join() #kill the process
+        for i, p in pool.imap_unordered(read_participant_Basic, tasks, 1): #one participant at a time
+            results[i] = p
+        pool.close()
+    except:
+        #a participant failed: stop the other processes and report the error instead of returning a partial list
+        pool.terminate()
+        pool.join()
+        raise
+    pool.join()
 
-    except  Exception as e:
-        exc_type, exc_obj, exc_tb = sys.exc_info()
-        print "Exception", sys.exc_info()
-        print "Line ", exc_tb.tb_lineno
-    
+    for i in sorted(results.keys()):
+        if results[i] is not None:
+            participants.append(results[i])
     return participants
-		
-def read_participants_Basic(q, datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets=None, 
+
+def get_participant_tasks(datadir, user_list, pids, prune_length = None, aoifile = None, log_time_offsets=None, 
                           require_valid_segs = True, auto_partition_low_quality_segments = False, rpsfile = None, export_pupilinfo = False):
-    """Generates list of Participant objects. Relevant information is read from input files
-    
-    Args:
-        q: Queue to which all processes must add return values.
-		
-        datadir: directory with user data (including "All-Data.tsv", "Fixation-Data.tsv", "Event-Data.tsv" files) 
-        for all participants
-        
-        user_list: list of user recordings (files extracted for one participant from Tobii studio)
-        
-        pids: User ID that is used in the external logs (can be different from above but there should be a 1-1 mapping)
-        
-        prune_length: If not None, an integer that specifies the time 
-            interval (in ms) from the beginning of each Segment in which
-            samples are considered in calculations.  This can be used if, 
-            for example, you only wish to consider data in the first 
-            1000 ms of each Segment. In this case (prune_length = 1000),
-            all data beyond the first 1000ms of the start of the "Segment"s
-            will be disregarded.
-        
-        aoifile: If not None, a string containing the name of the '.aoi' file 
-            with definitions of the "AOI"s.
-        
-        log_time_offset: If not None, an integer indicating the time offset between the 
-            external log file and eye tracking logs
+    """Returns the arguments of read_participant_Basic for each participant, see read_participants_Basic_multiprocessing for the arguments
     
-        require_valid_segs: a boolean determining whether invalid "Segment"s
-            will be ignored when calculating the features or not. default = True 
-        
-        auto_partition_low_quality_segments: a boolean indicating whether EMDAT should 
-            split the "Segment"s which have low sample quality, into two new 
-            sub "Segment"s discarding the largest gap of invalid samples.
-        
-        rpsfile: If not None, a string containing the name of the '.tsv' file 
-            with rest pupil sizes for all scenes and for each user. 
-        
     Returns:
-        a list Participant objects (in queue)
+        a list of tuples (index in user_list, input files, recording, pid, keyword arguments of BasicParticipant)
     """
-    participants = []
     if log_time_offsets == None:    #setting the default offset which is 1 sec
         log_time_offsets = [1]*len(pids) 
     
     # read rest pupil sizes (rpsvalues) from rpsfile
     rpsdata = read_rest_pupil_sizes(rpsfile)
     
-    for rec,pid,offset in zip(user_list,pids,log_time_offsets):
-        print "pid:", pid
-        
+    tasks = []
+    for i, (rec,pid,offset) in enumerate(zip(user_list,pids,log_time_offsets)):
         #extract pupil sizes for the current user. Set to None if not available
         if rpsdata != None:
             currpsdata = rpsdata[pid]
         else:
             currpsdata = None
+        files = get_participant_files(datadir, rec)
+        options = {'log_time_offset': offset, 'aoifile': aoifile, 'prune_length': prune_length,
+                   'require_valid_segs': require_valid_segs,
+                   'auto_partition_low_quality_segments': auto_partition_low_quality_segments,
+                   'rpsdata': currpsdata, 'export_pupilinfo': export_pupilinfo}
+        tasks.append((i, files, rec, pid, options))
+    return tasks
+
+def get_participant_files(datadir, rec):
+    """Returns the names of the input files of a user recording
+    
+    Args:
+        datadir: directory with user data
         
+        rec: the user recording
+    
+    Returns:
+        the names of the "All-Data", "Fixation-Data" and "Event-Data" files and of the '.seg' file
+    """
+    if params.EYETRACKERTYPE == "Tobii":
         if rec<10:
-            allfile = datadir+'/P0'+str(rec)+'-All-Data.tsv'
-            fixfile = datadir+'/P0'+str(rec)+'-Fixation-Data.tsv'
-            evefile = datadir+'/P0'+str(rec)+'-Event-Data.tsv'
-            segfile = datadir+'/P0'+str(rec)+'.seg'
+            prefix = datadir+'/P0'+str(rec)
         else:
-            allfile = datadir+'/P'+str(rec)+'-All-Data.tsv'
-            fixfile = datadir+'/P'+str(rec)+'-Fixation-Data.tsv'
-            evefile = datadir+'/P'+str(rec)+'-Event-Data.tsv'
-            segfile = datadir+'/P'+str(rec)+'.seg'
-        print allfile
-        import os.path
-        if os.path.exists(allfile):
-            p = BasicParticipant(rec, evefile, allfile, fixfile, segfile, log_time_offset = offset, 
-                                aoifile=aoifile, prune_length = prune_length, require_valid_segs = require_valid_segs,
-                                auto_partition_low_quality_segments = auto_partition_low_quality_segments, rpsdata = currpsdata, export_pupilinfo=export_pupilinfo)
-            participants.append(p)
-        else:
-            print "Error reading participant files for: "+pid
-    q.put(participants)
-    return
+            prefix = datadir+'/P'+str(rec)
+        return prefix+'-All-Data.tsv', prefix+'-Fixation-Data.tsv', prefix+'-Event-Data.tsv', prefix+'.seg'
+    elif params.EYETRACKERTYPE == "SMI":
+        allfile = "{dir}/SMI_Sample_{rec}_Samples.txt".format(dir=datadir, rec=rec)
+        fixfile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
+        evefile = "{dir}/SMI_Sample_{rec}_Events.txt".format(dir=datadir, rec=rec)
+        segfile = "{dir}/SMI_Sample_{rec}.seg".format(dir=datadir, rec=rec)
+        return allfile, fixfile, evefile, segfile
+    raise Exception("Unknown eye tracker type.")
+
+def get_input_size(files):
+    """Returns the total size in bytes of the existing input files of a participant, an estimate of its processing time
+    """
+    return sum(map(os.path.getsize, filter(os.path.exists, set(files[:3]))))
 
+def read_participant_Basic(task):
+    """Reads one participant, the unit of work of the processes of read_participants_Basic_multiprocessing
+    
+    Args:
+        task: a tuple as returned by get_participant_tasks, optionally followed by the list of exports of
+            the compact_features argument of read_participants_Basic_multiprocessing
+    
+    Returns:
+        the index of the participant in user_list and a BasicParticipant object (or a ParticipantFeatures
+        object if compact_features is given), or None if its files do not exist
+    """
+    i, (allfile, fixfile, evefile, segfile), rec, pid, options = task[:5]
+    compact_features = task[5] if len(task) > 5 else None
+    print "pid:", pid
+    print allfile
+    if not os.path.exists(allfile):
+        print "Error reading participant files for: "+str(pid)
+        return i, None
+    p = BasicParticipant(rec, evefile, allfile, fixfile, segfile, **options)
+    if compact_features is not None:
+        return i, ParticipantFeatures(p, compact_features)
+    return i, p
+		
 def partition_Basic(segfile):
     """Generates the scenelist based on a .seg file
     
@@ -6,6 +6,7 @@ Created on 2011-09-25
 @author: skardan
 """
 import string
+from array import array
 from data_structures import *
 import params
 from Scene import Scene
@@ -239,6 +240,125 @@ class Participant():
             print format_list(sc_feats,l)
     
 
+class ParticipantFeatures():
+    """The exported features of a Participant in a compact form
+    
+    It keeps only the feature names and values of the "Scene"s of a Participant for one or more exports
+    and the validity of the Participant and of its "Scene"s, not the "Segment"s, "Scene"s and data they were
+    calculated from, so it is cheap to send from one process to another. It can be passed to
+    export_features_all and write_features_tsv instead of the Participant, with the feature lists of one
+    of its exports.
+    
+    Attributes:
+        pid: Participant id
+        valid: a boolean indicating whether the Participant is valid
+        proportion_valid, largest_data_gap, proportion_valid_fix: the validity measures of the whole
+            Scene of the Participant, used by is_valid with a threshold
+        exports: a dict with the (featurelist, aoifeaturelist, aoifeaturelabels) of each export, as
+            tuples, as keys and, as values, a list with, for each Scene, a tuple of its scid, whether it is
+            valid, its list of feature names, an array of its numeric feature values, the indices of the
+            integer values in that array and a dict with the indices and values of the other features
+            (e.g., the AOI sequences)
+    """
+    
+    def __init__(self, participant, exports = [{}]):
+        """Inits ParticipantFeatures class from the features of all the "Scene"s of a Participant
+        
+        Args:
+            participant: a Participant object
+            exports: a list of dicts with the featurelist, aoifeaturelist and/or aoifeaturelabels
+                arguments of Participant.export_features of each export, e.g., the features and then
+                the AOI sequences
+            
+        Yields:
+            a ParticipantFeatures object
+        """
+        self.pid = participant.pid
+        self.valid = participant.is_valid()
+        whole_scene = participant.whole_scene
+        self.proportion_valid = whole_scene.proportion_valid
+        self.largest_data_gap = whole_scene.largest_data_gap
+        self.proportion_valid_fix = whole_scene.proportion_valid_fix
+        self.exports = {}
+        names = {}
+        for export in exports:
+            featurelist = export.get('featurelist')
+            aoifeaturelist = export.get('aoifeaturelist')
+            aoifeaturelabels = export.get('aoifeaturelabels')
+            scenes = []
+            for sc in participant.scenes:
+                fnames, fvals = sc.get_features(featurelist = featurelist, aoifeaturelist = aoifeaturelist,
+                                                aoifeaturelabels = aoifeaturelabels)
+                fnames = names.setdefault(tuple(fnames), fnames)    #the scenes with the same features share their names
+                values = array('d', [0.0]) * len(fvals)
+                ints = []
+                others = {}
+                for i, v in enumerate(fvals):
+                    if isinstance(v, float):
+                        values[i] = v
+                    elif isinstance(v, (int, long)) and not isinstance(v, bool) and float(v) == v:
+                        values[i] = v
+                        ints.append(i)
+                    else:
+                        others[i] = v
+                scenes.append((sc.scid, sc.is_valid, fnames, values, array('i', ints), others))
+            self.exports[_export_key(featurelist, aoifeaturelist, aoifeaturelabels)] = scenes
+    
+    def is_valid(self, method = None, threshold = None):
+        """Determines if the samples for this Participant meets the validity threshold, see Participant.is_valid
+        """
+        if threshold == None:
+            return self.valid
+        elif method == None:
+            method = params.VALIDITY_METHOD
+            
+        if method == 1:
+            return self.proportion_valid > threshold
+        elif method == 2:
+            return self.largest_data_gap <= threshold
+        elif method == 3:
+            return self.proportion_valid_fix > threshold
+    
+    def export_features(self, featurelist=None, aoifeaturelist=None, aoifeaturelabels = None,
+                        id_prefix = False, require_valid = True):
+        """Returns feature names and their values for this Participant, see Participant.export_features
+        
+        The feature lists must be the ones of one of the exports this object was built with.
+        """
+        key = _export_key(featurelist, aoifeaturelist, aoifeaturelabels)
+        if key not in self.exports:
+            raise Exception('The features of participant %s were calculated for other feature lists' %(self.pid))
+        data = []
+        featnames = []
+        if id_prefix:
+            featnames.append('Part_id')
+        featnames.append('Sc_id')
+        first = True
+        for scid, valid, fnames, values, ints, others in self.exports[key]:
+            if not valid and require_valid:
+                print "User %s:Scene %s dropped because of 'require_valid'" %(self.pid,scid)
+                continue
+            sc_feats = []
+            if id_prefix:
+                sc_feats.append(self.pid)
+            sc_feats.append(scid)
+            fvals = list(values)
+            for i in ints:
+                fvals[i] = int(fvals[i])
+            for i, v in others.iteritems():
+                fvals[i] = v
+            if first: featnames += fnames
+            sc_feats += fvals
+            first = False
+            data.append(sc_feats)
+        return featnames, data
+
+def _export_key(featurelist, aoifeaturelist, aoifeaturelabels):
+    """Helper function of ParticipantFeatures that returns the feature lists of an export as a dict key
+    """
+    return tuple(map(lambda x: None if x is None else tuple(x), [featurelist, aoifeaturelist, aoifeaturelabels]))
+
+
 def read_participants(segsdir, datadir, prune_length = None, aoifile = None):
     """Placeholder for a method that generates Participant objects for each participant 
     in the experiment 
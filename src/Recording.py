@@ -12,6 +12,8 @@ for one participant
 """
 
 from abc import ABCMeta, abstractmethod
+from multiprocessing import Pool, current_process
+import os
 from data_structures import Datapoint, Fixation, Event
 from Scene import *
 from AOI import *
@@ -78,7 +80,8 @@ class Recording:
 
     def process_rec(self, segfile=None, scenelist=None, aoifile=None,
                     aoilist=None, prune_length=None, require_valid_segs=True,
-                    auto_partition_low_quality_segments=False, rpsdata=None, export_pupilinfo=False):
+                    auto_partition_low_quality_segments=False, rpsdata=None, export_pupilinfo=False, processes=None,
+                    feature_groups=None):
         """Processes the data for one recording (i.e, one complete experiment session)
 
         Args:
@@ -114,6 +117,19 @@ class Recording:
                 the "Segment". default = False
                 
             rpsdata: a dictionary with rest pupil sizes: (scene name is a key, rest pupil size is a value)
+
+            processes: if larger than 1, the number of processes that compute the "Scene"s in parallel.
+                The processes are forked after the Recording is read, so they share its data copy-on-write
+                instead of receiving a copy, and send back the "Scene"s with their features calculated.
+                The "Scene"s are computed serially where fork is not available or inside a daemonic
+                process (e.g., a worker of read_participants_Basic_multiprocessing)
+
+            feature_groups: if not None, the names of the feature groups the processes calculate, e.g.,
+                as returned by features.plan_feature_groups for the features that will be exported. The
+                other groups are given up (see Segment.discard_feature_groups), so their features are not
+                available on the "Scene"s and "Segment"s. If None, the processes calculate all the feature
+                groups before sending the "Scene"s back: the parallel path does not calculate features lazily.
+                Only used when the "Scene"s are computed in parallel
         Returns:
             a list of Scene objects for this Recording
             a list of Segment objects for this recording. This is an aggregated list
@@ -133,46 +149,106 @@ class Recording:
             aoilist = []
             print "No AOIs defined!"
 
-        scenes = []
-        for scid, sc in scenelist.iteritems():
-            print "Preparing scene:" + str(scid)
-            if params.DEBUG:
-                print "len(all_data)", len(self.all_data)
-            try:
-                # get rest pupil size data
-                if rpsdata is not None:
-                    if scid in rpsdata.keys():
-                        scrpsdata = rpsdata[scid]
-                    else:
-                        scrpsdata = 0
-                        print rpsdata.keys()
-                        if params.DEBUG:
-                            raise Exception(
-                                "Scene ID " + scid + " is not in the dictionary with rest pupil sizes. rpsdata is set to 0")
-                        else:
-                            print "Scene ID " + scid + " is not in the dictionary with rest pupil sizes. rpsdata is set to 0"
-                            pass
-                else:
-                    scrpsdata = 0
-                new_scene = Scene(scid, sc, self.all_data, self.fix_data, event_data=self.event_data, aoilist=aoilist,
-                                  prune_length=prune_length,
-                                  require_valid=require_valid_segs,
-                                  auto_partition=auto_partition_low_quality_segments, rest_pupil_size=scrpsdata,
-                                  export_pupilinfo=export_pupilinfo)
-            except Exception as e:
-                warn(str(e))
-                new_scene = None
-                if params.DEBUG:
-                    raise
-                else:
-                    pass
-            if new_scene:
-                scenes.append(new_scene)
+        args = (aoilist, prune_length, require_valid_segs, auto_partition_low_quality_segments, rpsdata,
+                export_pupilinfo)
+        if processes is not None and processes > 1 and len(scenelist) > 1 and hasattr(os, 'fork') and not current_process().daemon:
+            scenes = process_scenes_parallel(self, scenelist, args, processes, feature_groups)
+        else:
+            scenes = map(lambda (scid, sc): self.process_scene(scid, sc, *args), scenelist.iteritems())
+        scenes = filter(None, scenes)
         segs = []
         for sc in scenes:
             segs.extend(sc.segments)
         return segs, scenes
 
+    def process_scene(self, scid, sc, aoilist, prune_length, require_valid_segs, auto_partition_low_quality_segments,
+                      rpsdata, export_pupilinfo):
+        """Returns the Scene of one scene of the scenelist of process_rec, see process_rec for the arguments
+
+        Returns:
+            a Scene object, or None if the Scene could not be built
+        """
+        print "Preparing scene:" + str(scid)
+        if params.DEBUG:
+            print "len(all_data)", len(self.all_data)
+        try:
+            # get rest pupil size data
+            if rpsdata is not None:
+                if scid in rpsdata.keys():
+                    scrpsdata = rpsdata[scid]
+                else:
+                    scrpsdata = 0
+                    print rpsdata.keys()
+                    if params.DEBUG:
+                        raise Exception(
+                            "Scene ID " + scid + " is not in the dictionary with rest pupil sizes. rpsdata is set to 0")
+                    else:
+                        print "Scene ID " + scid + " is not in the dictionary with rest pupil sizes. rpsdata is set to 0"
+                        pass
+            else:
+                scrpsdata = 0
+            new_scene = Scene(scid, sc, self.all_data, self.fix_data, event_data=self.event_data, aoilist=aoilist,
+                              prune_length=prune_length,
+                              require_valid=require_valid_segs,
+                              auto_partition=auto_partition_low_quality_segments, rest_pupil_size=scrpsdata,
+                              export_pupilinfo=export_pupilinfo)
+        except Exception as e:
+            warn(str(e))
+            new_scene = None
+            if params.DEBUG:
+                raise
+            else:
+                pass
+        return new_scene
+
+
+_shared_scene_work = None
+"""the Recording, scenelist, arguments and feature groups of the process_rec call whose scenes are computed in parallel"""
+
+
+def process_scenes_parallel(rec, scenelist, args, processes, feature_groups = None):
+    """Returns the "Scene"s of a scenelist computed over a pool of forked processes
+
+    The Recording is handed to the processes through a module variable that is set before they are forked,
+    so its data are shared copy-on-write. Each process computes the feature groups of its "Scene"s and their
+    "Segment"s before sending them back, so the whole-participant Scene can be merged from them in this process.
+
+    Args:
+        rec: a Recording object
+        scenelist: a dict with scid as the key and segments as value, as returned by read_segs
+        args: the arguments of Recording.process_scene after scid and sc
+        processes: the number of processes
+        feature_groups: if not None, the names of the feature groups to calculate; the other pending groups
+            are given up. All the groups are calculated if None
+
+    Returns:
+        a list with a Scene object, or None, per scene of scenelist
+    """
+    global _shared_scene_work
+    _shared_scene_work = (rec, scenelist, args, feature_groups)
+    try:
+        pool = Pool(min(processes, len(scenelist)))
+        try:
+            scenes = pool.map(_process_shared_scene, scenelist.keys(), 1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _shared_scene_work = None
+    return scenes
+
+
+def _process_shared_scene(scid):
+    """Helper function of process_scenes_parallel that computes one Scene in a process of the pool
+    """
+    rec, scenelist, args, feature_groups = _shared_scene_work
+    scene = rec.process_scene(scid, scenelist[scid], *args)
+    if scene is not None:
+        for obj in scene.segments + [scene]:
+            obj.compute_feature_groups(feature_groups)
+            obj.discard_feature_groups()
+    return scene
+
 
 def read_segs(segfile):
     """Returns a dict with scid as the key and segments as value from a '.seg' file.
@@ -212,10 +288,16 @@ def read_aois(aoifile):
     #[tab]start1,end1[tab]...[new line]
 
     The first line determines name of the AOI and the coordinates of each vertex of
-    the polygon that determines the boundaries of the AOI.
+    the polygon that determines the boundaries of the AOI. A composite AOI lists several
+    polygons separated by ';' on its first line:
+    aoiname[tab]point1x,point1y[tab]...;[tab]point1x,point1y[tab]...[new line]
     The second line which starts with a '#' is optional and determines the time
     intervals when the AOI is active. If the second line does not exist the AOI will
     be active throughout the whole session (global AOI).
+    A moving AOI has only its name on its first line, followed by one line per keyframe
+    with the timestamp and the polygon(s) of the AOI at that time (see "MovingAOI"):
+    @[tab]timestamp[tab]point1x,point1y[tab]point2x,point2y[tab]...[new line]
+    and then its optional '#' line.
     *Note: If the AOIs are exported from Tobii software the '.aoi' file will only have the
     first line for each AOI and you need to override this method to generate AOIs that are
     active only at certain times (non-global AOI).
@@ -242,38 +324,71 @@ def read_aoilines(aoilines):
     """
     aoilist = []
     polyin = []
+    keyframes = []
     last_aid = ''
 
     for line in aoilines:
         chunks = line.strip().split('\t')
         if chunks[0].startswith('#'):  # second line
-            if polyin:
+            if polyin or keyframes:
                 seq = []
                 for v in chunks[1:]:
                     seq.append((eval(v)))
 
-                aoi = AOI(last_aid, polyin, [], seq)
-                aoilist.append(aoi)
+                aoilist.append(new_aoi(last_aid, polyin, keyframes, seq))
                 polyin = []
+                keyframes = []
             else:
                 raise Exception('error in the AOI file')
+        elif chunks[0].startswith('@'):  # keyframe of a moving AOI
+            keyframes.append((eval(chunks[1]), read_polygons('\t'.join(chunks[2:]))))
         else:
-            if polyin:  # global AOI
-                aoi = AOI(last_aid, polyin, [], [])
-                aoilist.append(aoi)
+            if polyin or keyframes:  # global AOI
+                aoilist.append(new_aoi(last_aid, polyin, keyframes, []))
                 polyin = []
+                keyframes = []
 
             last_aid = chunks[0]  # first line
-            for v in chunks[1:]:
-                polyin.append((eval(v)))
+            polyin = read_polygons('\t'.join(chunks[1:]))
 
-    if polyin:  # last (global) AOI
-        aoi = AOI(last_aid, polyin, [], [])
-        aoilist.append(aoi)
+    if polyin or keyframes:  # last (global) AOI
+        aoilist.append(new_aoi(last_aid, polyin, keyframes, []))
 
     return aoilist
 
 
+def new_aoi(aid, polyin, keyframes, timeseq):
+    """Returns the "AOI" read from a '.aoi' file, a "MovingAOI" if it has keyframes
+    """
+    if keyframes:
+        if polyin:
+            raise Exception('error in the AOI file: moving AOI with a polygon on its first line:' + aid)
+        return MovingAOI(aid, keyframes, timeseq)
+    return AOI(aid, polyin, [], timeseq)
+
+
+def read_polygons(text):
+    """Returns the polygon, or the list of polygons of a composite AOI, defined in the first line of an AOI
+    
+    Args:
+        text: the vertices of the first line of an AOI in a '.aoi' file, without the AOI name
+    
+    Returns:
+        a list of (x,y) tuples if text has one polygon, otherwise a list of such lists
+    """
+    polygons = []
+    for chunk in text.split(';'):
+        polygon = []
+        for v in chunk.split('\t'):
+            if v.strip():
+                polygon.append((eval(v)))
+        if polygon:
+            polygons.append(polygon)
+    if len(polygons) == 1:
+        return polygons[0]
+    return polygons
+
+
 def get_pupil_size(pupilleft, pupilright):
     if pupilleft is None and pupilright is None:
         return -1
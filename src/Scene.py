@@ -8,7 +8,6 @@ Created on 2011-09-30
 import math, geometry
 from utils import *
 from Segment import *
-from copy import deepcopy
 
 
 class Scene(Segment):
@@ -49,6 +48,10 @@ class Scene(Segment):
         fixation_start = fixation_data[0].timestamp
         fixation_end = fixation_data[-1].timestamp
         aoi_data: A list of AOI_Stat objects for relevants "AOI"s for this Scene
+        aoi_table: An AOIStatTable with the merged AOI statistics of the "Segment"s of this Scene
+        transition_matrix: An AOITransitions with the sum of the transition matrices of the "Segment"s of this Scene
+        aoi_samples: A dict with AOI ids as keys and the number of valid gaze samples inside them in the "Segment"s as values
+        numgazesamples: An integer indicating the number of valid gaze samples in the "Segment"s of this Scene
         has_aois: A boolean indicating if this Scene has AOI features calculated for it
         
     """
@@ -255,9 +258,6 @@ class Scene(Segment):
         if len(segments)==0:
             raise Exception('no segments in scene %s!' %(scid))
         
-        fixationlist = []
-        eventlist = []
-        sample_list = []
         totalfixations = 0
         firstsegtime = float('infinity')
         firstseg = None 
@@ -265,162 +265,63 @@ class Scene(Segment):
             sample_st,sample_end,fix_start,fix_end,event_st,event_end = seg.get_indices()
             if params.DEBUG:
                 print "sample_st,sample_end,fix_start,fix_end",sample_st,sample_end,fix_start,fix_end,event_st,event_end
-            sample_list.append(all_data[sample_st:sample_end])
-            fixationlist.append(fixation_data[fix_start:fix_end])
-            totalfixations += len(fixationlist[-1])
-            if event_data != None:
-                eventlist.append(event_data[event_st:event_end])
-                totalevents = len(eventlist[-1])
+            totalfixations += fix_end - fix_start
             if seg.start < firstsegtime:
                 firstsegtime = seg.start
                 firstseg = seg
         
         self.firstseg = firstseg
         self.scid = scid
-        self.features = {}
-        self.largest_data_gap = maxfeat(self.segments,'largest_data_gap')   #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
-        self.proportion_valid = weightedmeanfeat(self.segments,'numsamples','proportion_valid') #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
-        self.proportion_valid_fix = weightedmeanfeat(self.segments,'numsamples','proportion_valid_fix') #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
+        self.features = LazyFeatures(self.compute_feature_group)
+        self.moments = LazyFeatures(self.compute_feature_group)
+        validity = aggregate(self.segments, SCENE_VALIDITY_AGGREGATIONS)   #self.segments is used to calculate validity of the scenes instead of segments which is only valid segments
+        self.largest_data_gap = validity['largest_data_gap']
+        self.proportion_valid = validity['proportion_valid']
+        self.proportion_valid_fix = validity['proportion_valid_fix']
         self.validity1 = self.calc_validity1()
         self.validity2 = self.calc_validity2()
         self.validity3 = self.calc_validity3()
         self.is_valid = self.get_validity()
 
-        self.length = sumfeat(segments,'length')
+        totals = aggregate(segments, SCENE_AGGREGATIONS)
+        self.length = totals['length']
         if self.length == 0:
             raise Exception('Zero length segments!')
         self.features['numsegments'] = len(segments)
         self.features['length'] = self.length
-        self.start = minfeat(segments,'start')
-        self.numfixations = sumfeat(segments,'numfixations')
-        self.end = maxfeat(segments,'end')
-        self.numsamples = sumfeat(segments, 'numsamples')
+        self.start = totals['start']
+        self.end = totals['end']
+        self.numsamples = totals['numsamples']
         self.features['numsamples'] = self.numsamples
         
-        self.numfixations = sumfeat(segments, 'numfixations')
+        self.numfixations = totals['numfixations']
         self.features['numfixations'] = self.numfixations
         if prune_length == None:
             if self.numfixations != totalfixations:
                 raise Exception('error in fixation count for scene:'+self.scid)
             #warn ('error in fixation count for scene:'+self.scid)
         self.features['fixationrate'] = float(self.numfixations) / self.length
-        if self.numfixations > 0:
-            self.features['meanfixationduration'] = weightedmeanfeat(segments,'numfixations',"features['meanfixationduration']")
-            self.features['stddevfixationduration'] = stddev(map(lambda x: float(x.fixationduration), reduce(lambda x,y: x+y ,fixationlist)))##
-            self.features['sumfixationduration'] = sumfeat(segments, "features['sumfixationduration']")
-            self.features['fixationrate'] = float(self.numfixations)/self.length
-            distances = self.calc_distances(fixationlist)
-            abs_angles = self.calc_abs_angles(fixationlist)
-            rel_angles = self.calc_rel_angles(fixationlist)
-        else:
-            self.features['meanfixationduration'] = 0
-            self.features['stddevfixationduration'] = 0
-            self.features['sumfixationduration'] = 0
-            self.features['fixationrate'] = 0
-            distances = []
-        if len(distances) > 0:
-            self.features['meanpathdistance'] = mean(distances)
-            self.features['sumpathdistance'] = sum(distances)
-            self.features['stddevpathdistance'] = stddev(distances)
-            self.features['eyemovementvelocity'] = self.features['sumpathdistance']/self.length
-            self.features['sumabspathangles'] = sum(abs_angles)
-            self.features['meanabspathangles'] = mean(abs_angles)
-            self.features['abspathanglesrate'] = sum(abs_angles)/self.length
-            self.features['stddevabspathangles'] = stddev(abs_angles)
-            self.features['sumrelpathangles'] = sum(rel_angles)
-            self.features['relpathanglesrate'] = sum(rel_angles)/self.length
-            self.features['meanrelpathangles'] = mean(rel_angles)
-            self.features['stddevrelpathangles'] = stddev(rel_angles)
-        else:
-            self.features['meanpathdistance'] = 0
-            self.features['sumpathdistance'] = 0
-            self.features['stddevpathdistance'] = 0
-            self.features['eyemovementvelocity'] = 0
-            self.features['sumabspathangles'] = 0
-            self.features['abspathanglesrate'] = 0
-            self.features['meanabspathangles']= 0
-            self.features['stddevabspathangles']= 0
-            self.features['sumrelpathangles'] = 0
-            self.features['relpathanglesrate'] = 0
-            self.features['meanrelpathangles']= 0
-            self.features['stddevrelpathangles'] = 0
-        
-        """ calculate pupil dilation features (no rest pupil size adjustments yet)""" 
-        
-        self.numpupilsizes = sumfeat(segments,'numpupilsizes')
-        self.adjvalidpupilsizes = mergevalues(segments, 'adjvalidpupilsizes')
-        if self.numpupilsizes > 0: # check if scene has any pupil data
-            if export_pupilinfo:
-                self.pupilinfo_for_export = mergevalues(segments, 'pupilinfo_for_export') 
-            self.features['meanpupilsize'] = weightedmeanfeat(segments, 'numpupilsizes', "features['meanpupilsize']")
-            self.features['stddevpupilsize'] = stddev(self.adjvalidpupilsizes)
-            self.features['maxpupilsize'] = maxfeat(segments, "features['maxpupilsize']")
-            self.features['minpupilsize'] = minfeat(segments, "features['minpupilsize']")
-            self.features['startpupilsize'] = segments[0].features['startpupilsize']
-            self.features['endpupilsize'] = segments[-1].features['endpupilsize']
-        else:
-            self.pupilinfo_for_export = [] 
-            self.features['meanpupilsize'] = 0
-            self.features['stddevpupilsize'] = 0
-            self.features['maxpupilsize'] = 0
-            self.features['minpupilsize'] = 0
-            self.features['startpupilsize'] = 0
-            self.features['endpupilsize'] = 0
-        """end """
 
-        self.numdistances = sumfeat(segments,'numdistances') #Distance
-        self.distances_from_screen = mergevalues(segments, 'distances_from_screen')
-        if self.numdistances > 0: # check if scene has any pupil data
-            self.features['meandistance'] = weightedmeanfeat(segments, 'numdistances', "features['meandistance']")
-            self.features['stddevdistance'] = stddev(self.distances_from_screen)
-            self.features['maxdistance'] = maxfeat(segments, "features['maxdistance']")
-            self.features['mindistance'] = minfeat(segments, "features['mindistance']")
-            self.features['startdistance'] = segments[0].features['startdistance']
-            self.features['enddistance'] = segments[-1].features['enddistance']
-        else:
-            self.features['meandistance'] = 0
-            self.features['stddevdistance'] = 0
-            self.features['maxdistance'] = 0
-            self.features['mindistance'] = 0
-            self.features['startdistance'] = 0
-            self.features['enddistance'] = 0
-        """end """
+        """ the remaining features are merged from the "Segment"s per group on first access """
+        self.defer_feature_groups({'segments': segments, 'event_data': event_data, 'aois': aoilist,
+                                   'export_pupilinfo': export_pupilinfo})
 
-        if event_data != None:
-            self.features['numevents'] = sumfeat(segments,'numevents')
-            self.features['numleftclic'] = sumfeat(segments,"features['numleftclic']")
-            self.features['numrightclic'] = sumfeat(segments, "features['numrightclic']")
-            self.features['numdoubleclic'] = sumfeat(segments, "features['numdoubleclic']")
-            self.features['numkeypressed'] = sumfeat(segments, "features['numkeypressed']")
-            self.features['leftclicrate'] = float(self.features['numleftclic'])/self.length
-            self.features['rightclicrate'] = float(self.features['numrightclic'])/self.length
-            self.features['doubleclicrate'] = float(self.features['numdoubleclic'])/self.length
-            self.features['keypressedrate'] = float(self.features['numkeypressed'])/self.length
-            self.features['timetofirstleftclic'] = segments[0].features['timetofirstleftclic']
-            self.features['timetofirstrightclic'] = segments[0].features['timetofirstrightclic']
-            self.features['timetofirstdoubleclic'] = segments[0].features['timetofirstdoubleclic']
-            self.features['timetofirstkeypressed'] = segments[0].features['timetofirstkeypressed']
-        else:
-            self.features['numevents'] = 0
-            self.features['numleftclic'] = 0
-            self.features['numrightclic'] = 0
-            self.features['numdoubleclic'] = 0
-            self.features['numkeypressed'] = 0
-            self.features['leftclicrate'] = 0
-            self.features['rightclicrate'] = 0
-            self.features['doubleclicrate'] = 0
-            self.features['keypressedrate'] = 0
-            self.features['timetofirstleftclic'] = -1
-            self.features['timetofirstrightclic'] = -1
-            self.features['timetofirstdoubleclic'] = -1
-            self.features['timetofirstkeypressed'] = -1
-        """end """
+    def feature_group_applies(self, group):
+        """Returns True if all the inputs a FeatureGroup requires for a Scene are given and none of the "Segment"s gave up the group
+        """
+        if filter(lambda seg: group.name in seg.discarded_groups, self.feature_inputs['segments']):
+            return False
+        return all(map(lambda x: self.feature_inputs.get(x), group.scene_required))
 
-        self.has_aois = False
-        if aoilist:
-            self.set_aois(segments, aoilist)
-        
-        self.features['aoisequence'] = self.merge_aoisequences(segments)
+    def calc_feature_group(self, group):
+        """Runs the merge rule of a FeatureGroup on this Scene
+        """
+        group.merge(self, self.feature_inputs)
+
+    def get_group_inputs(self, group):
+        """Returns the names of the inputs of this Scene a FeatureGroup reads in its merge rule
+        """
+        return group.scene_inputs
             
     def getid(self):
         """Returns the scid for this Scene
@@ -432,225 +333,54 @@ class Scene(Segment):
     def set_aois(self, segments, aois):
         """Sets the "AOI"s relevant to this Scene
         
+        The AOIStatTable of the "Segment"s are added up and the AOI_Stat objects of the Scene are built once
+        from the merged table.
+        
         Args:
             segments: a list of "Segment"s which belong to this Scene.
 
             aois: a list of "AOI"s relevant to this Scene        
         """
         if len(aois) == 0:
-            print "no AOI:",self.segid
-        self.aoi_data={}
+            print "no AOI:",self.scid
+        self.aoi_table = AOIStatTable(aois)
         for seg in segments:
-            for aid in seg.aoi_data.keys():
-                if seg.aoi_data[aid].isActive:
-                    if aid in self.aoi_data:
-                        self.aoi_data[aid] = merge_aoistats(self.aoi_data[aid],seg.aoi_data[aid], self.features['length'],self.numfixations)
-                    else:
-                        self.aoi_data[aid] = deepcopy(seg.aoi_data[aid])
+            self.aoi_table.merge(seg.aoi_table)
+        self.aoi_data = self.aoi_table.get_aoistats(self.length, self.numfixations)
         
-        firstsegaois = self.firstseg.aoi_data.keys()            
+        firstsegaois = self.firstseg.aoi_data
         for aid in self.aoi_data.keys():
-            if aid in firstsegaois:
-                self.aoi_data[aid].features['timetofirstfixation'] = deepcopy(self.firstseg.aoi_data[aid].features['timetofirstfixation'])
-                if self.firstseg.aoi_data[aid].features['timetofirstleftclic'] != -1:
-                    self.aoi_data[aid].features['timetofirstleftclic'] = deepcopy(self.firstseg.aoi_data[aid].features['timetofirstleftclic'])
-                    self.aoi_data[aid].features['timetofirstrightclic'] = deepcopy(self.firstseg.aoi_data[aid].features['timetofirstrightclic'])
-                    self.aoi_data[aid].features['timetofirstdoubleclic'] = deepcopy(self.firstseg.aoi_data[aid].features['timetofirstdoubleclic'])
+            if aid in firstsegaois and firstsegaois[aid].isActive:
+                firstfeatures = firstsegaois[aid].features
+                self.aoi_data[aid].features['timetofirstfixation'] = firstfeatures['timetofirstfixation']
+                if firstfeatures.get('timetofirstleftclic', -1) != -1:
+                    self.aoi_data[aid].features['timetofirstleftclic'] = firstfeatures['timetofirstleftclic']
+                    self.aoi_data[aid].features['timetofirstrightclic'] = firstfeatures['timetofirstrightclic']
+                    self.aoi_data[aid].features['timetofirstdoubleclic'] = firstfeatures['timetofirstdoubleclic']
             else:
                 self.aoi_data[aid].features['timetofirstfixation'] = float('inf')
-                self.aoi_data[aid].features['timetofirstleftclic'] = float('inf')
-                self.aoi_data[aid].features['timetofirstrightclic'] = float('inf')
-                self.aoi_data[aid].features['timetofirstdoubleclic'] = float('inf')
+                if 'numevents' in self.aoi_data[aid].features:
+                    self.aoi_data[aid].features['timetofirstleftclic'] = float('inf')
+                    self.aoi_data[aid].features['timetofirstrightclic'] = float('inf')
+                    self.aoi_data[aid].features['timetofirstdoubleclic'] = float('inf')
                 
         #maois.features['averagetimetofirstfixation'] = ?
         #maois.features['averagettimetolastfixation'] = ?
-            self.has_aois = True
-
-    def calc_distances(self, fixdatalists):
-        """returns the Euclidean distances between a sequence of "Fixation"s
-    
-        Args:
-            fixdatalists: a list of lists of "Fixation"s
-        """
-        distances = []
-        for fixdata in fixdatalists:
-            #print "fixdata", fixdata
-            if not(fixdata):
-                continue
-            lastx = fixdata[0].mappedfixationpointx
-            lasty = fixdata[0].mappedfixationpointy
-    
-            for i in xrange(1, len(fixdata)):
-                x = fixdata[i].mappedfixationpointx
-                y = fixdata[i].mappedfixationpointy
-                dist = math.sqrt((x-lastx)**2 + (y-lasty)**2)
-                distances.append(dist)
-                lastx = x
-                lasty = y
-        return distances
-    
-    def calc_abs_angles(self, fixdatalists):
-        """returns the absolute angles between a sequence of "Fixation"s that build a scan path.
-        
-        Abosolute angle for each saccade is the angle between that saccade and the horizental axis
-    
-        Args:
-            fixdatalists: a list of lists of "Fixation"s
-            
-        Returns:
-            a list of absolute angles for the saccades formed by the given sequence of "Fixation"s in Radiant
-        """
-        abs_angles = []
-        for fixdata in fixdatalists:
-            if not(fixdata):
-                continue
-            lastx = fixdata[0].mappedfixationpointx
-            lasty = fixdata[0].mappedfixationpointy
-    
-            for i in xrange(1,len(fixdata)):
-                x = fixdata[i].mappedfixationpointx
-                y = fixdata[i].mappedfixationpointy
-                (_, theta) = geometry.vector_difference((lastx,lasty), (x, y))
-                abs_angles.append(abs(theta))
-                lastx=x
-                lasty=y
-
-        return abs_angles
-
-    def calc_rel_angles(self, fixdatalists):
-        """returns the relative angles between a sequence of "Fixation"s that build a scan path in Radiant
-        
-        Relative angle for each saccade is the angle between that saccade and the previous saccade.
-    
-        Args:
-            fixdatalists: a list of lists of  "Fixation"s
-            
-        Returns:
-            a list of relative angles for the saccades formed by the given sequence of "Fixation"s in Radiant
-        """
-        rel_angles = []
-        
-        for fixdata in fixdatalists:
-            if not(fixdata):
-                continue
-            lastx = fixdata[0].mappedfixationpointx
-            lasty = fixdata[0].mappedfixationpointy
-    
-            for i in xrange(1, len(fixdata)-1):
-                x = fixdata[i].mappedfixationpointx
-                y = fixdata[i].mappedfixationpointy
-                nextx = fixdata[i+1].mappedfixationpointx
-                nexty = fixdata[i+1].mappedfixationpointy
-                (_, theta) = geometry.vector_difference((x,y), (lastx, lasty))
-                (_, nextheta) = geometry.vector_difference((x,y), (nextx, nexty))
-                theta = abs(theta-nextheta)
-                rel_angles.append(theta)
-                lastx=x
-                lasty=y
-
-        return rel_angles
+        self.has_aois = len(self.aoi_data) > 0
 
     def merge_aoisequences(self, segments):
         """returns the AOI sequence merged from the AOI sequences in the "Segment"s
         Args:
             segments: a list of "Segment"s which belong to this Scene.
         Returns:
-            a list of AOI names that correspond to the sequence of "Fixation"s in this Scene
+            an AOISequence of the AOI names that correspond to the sequence of "Fixation"s in this Scene
         """
-        sequence = []
+        sequence = AOISequence()
         for seg in segments:
-            sequence.extend(seg.features.get('aoisequence', []))
+            if 'aoisequence' in seg.features:
+                sequence.extend(seg.features['aoisequence'])
         return sequence
 
-    def clean_memory(self):
-        for seg in self.segments:
-            seg.adjvalidpupilsizes = []
-            seg.distances_from_screen = []
-        self.adjvalidpupilsizes = []
-        self.distances_from_screen = []
-
-def merge_aoistats(main_AOI_Stat,new_AOI_Stat,total_time,total_numfixations):
-        """a helper method that updates the AOI_Stat object of this Scene with a new AOI_Stat object
-        
-        Args:
-            main_AOI_Stat: AOI_Stat object of this Scene
-            
-            new_AOI_Stat: a new AOI_Stat object
-            
-            total_time:
-            
-            total_numfixations:
-        
-        Returns:
-            the updated AOI_Sata object
-        """   
-        maois = main_AOI_Stat
-        maois.features['numfixations'] += new_AOI_Stat.features['numfixations']
-        maois.features['longestfixation'] = max(maois.features['longestfixation'],new_AOI_Stat.features['longestfixation'])
-        maois.features['totaltimespent'] += + new_AOI_Stat.features['totaltimespent'] 
-        maois.features['proportiontime'] = float(maois.features['totaltimespent'])/total_time
-        maois.features['proportionnum'] = float(maois.features['numfixations'])/total_numfixations
-        if maois.features['totaltimespent']>0: 
-            maois.features['fixationrate'] = float(maois.features['numfixations'])/maois.features['totaltimespent']
-        else:
-            maois.features['fixationrate'] = 0.0
-                
-        #merge events
-        if new_AOI_Stat.features['numevents']>0:
-            maois.features['numevents'] += new_AOI_Stat.features['numevents']
-            maois.features['numleftclic'] += new_AOI_Stat.features['numleftclic']
-            maois.features['numrightclic'] += new_AOI_Stat.features['numrightclic']
-            maois.features['numdoubleclic'] += new_AOI_Stat.features['numdoubleclic']
-            maois.features['leftclicrate'] += float(maois.features['numleftclic'])/total_time
-            maois.features['rightclicrate'] += float(maois.features['numrightclic'])/total_time
-            maois.features['doubleclicrate'] += float(maois.features['numdoubleclic'])/total_time
-        else:
-            maois.features['numevents'] = 0
-            maois.features['numleftclic'] = 0
-            maois.features['numrightclic'] = 0
-            maois.features['numdoubleclic']  = 0
-            maois.features['leftclicrate'] = 0
-            maois.features['rightclicrate'] = 0
-            maois.features['doubleclicrate'] = 0
-            
-        #calculating the transitions to and from this AOI and other active AOIs at the moment
-        new_AOI_Stat_transition_aois = filter(lambda x: x.startswith(('numtransto_','numtransfrom_')),new_AOI_Stat.features.keys())
-        if params.DEBUG:
-            print "segement's transition_aois",new_AOI_Stat_transition_aois
-            
-        maois.total_tans_to += new_AOI_Stat.total_tans_to       #updating the total number of transition to this AOI
-        maois.total_tans_from += new_AOI_Stat.total_tans_from   #updating the total number of transition from this AOI
-        for feat in new_AOI_Stat_transition_aois:
-            if feat in maois.features:
-                maois.features[feat] += new_AOI_Stat.features[feat]
-            else:
-                maois.features[feat] = new_AOI_Stat.features[feat]
-#            if feat.startswith('numtransto_'):
-#                sumtransto += maois.features[feat]
-#            else:
-#                sumtransfrom += maois.features[feat]
-    
-    
-        # updating the proportion tansition features based on new transitions to and from this AOI        
-        maois_transition_aois = filter(lambda x: x.startswith(('numtransto_','numtransfrom_')),maois.features.keys()) #all the transition features for this AOI should be aupdated even if they are not active for this segment
-        for feat in maois_transition_aois:
-            if feat.startswith('numtransto_'):
-                aid = feat.lstrip('numtransto_')
-                if maois.total_tans_to > 0:
-
-                    maois.features['proptransto_%s'%(aid)] = float(maois.features[feat]) / maois.total_tans_to
-                else:
-                    maois.features['proptransto_%s'%(aid)] = 0
-            else:
-                aid = feat.lstrip('numtransfrom_')
-                if maois.total_tans_from > 0:
-                    
-                    maois.features['proptransfrom_%s'%(aid)] = float(maois.features[feat]) / maois.total_tans_from
-                else:
-                    maois.features['proptransfrom_%s'%(aid)] = 0
-        ###endof trnsition calculation
-        return maois
-
 def weightedmeanfeat(obj_list, totalfeat,ratefeat):
     """a helper method that calculates the weighted average of a target feature over a list of Segments
     
@@ -664,16 +394,7 @@ def weightedmeanfeat(obj_list, totalfeat,ratefeat):
     Returns:
         the weighted average of the ratefeat over the Segments
     """
-    num_valid = float(0)
-    num = 0
-
-    for obj in obj_list:
-        t = eval('obj.'+totalfeat)
-        num_valid += t * eval('obj.'+ratefeat)
-        num += t
-    if num != 0:
-        return num_valid / num
-    return 0
+    return aggregate(obj_list, compile_aggregations([('mean', 'weightedmean', ratefeat, totalfeat)]))['mean']
     
 
 def sumfeat(obj_list, feat):
@@ -688,10 +409,7 @@ def sumfeat(obj_list, feat):
     Returns:
         the sum of the target feature over the given list of objects
     """
-    sum = 0
-    for obj in obj_list:
-        sum += eval('obj.'+feat)
-    return sum
+    return aggregate(obj_list, compile_aggregations([('sum', 'sum', feat, None)]))['sum']
 
 def minfeat(obj_list, feat):
     """a helper method that calculates the min of a target feature over a list of objects
@@ -705,12 +423,7 @@ def minfeat(obj_list, feat):
     Returns:
         the min of the target feature over the given list of objects
     """
-    min = float('+infinity')
-    for obj in obj_list:
-        val = eval('obj.'+feat)
-        if min > val:
-            min = val
-    return min     
+    return aggregate(obj_list, compile_aggregations([('min', 'min', feat, None)]))['min']
     
 def maxfeat(obj_list, feat):
     """a helper method that calculates the max of a target feature over a list of objects
@@ -724,12 +437,7 @@ def maxfeat(obj_list, feat):
     Returns:
         the max of the target feature over the given list of objects
     """
-    max = float('-infinity')
-    for obj in obj_list:
-        val = eval('obj.'+feat)
-        if max < val:
-            max = val
-    return max   
+    return aggregate(obj_list, compile_aggregations([('max', 'max', feat, None)]))['max']
   
 def mergevalues(obj_list, field):
     """a helper method that merges lists of values stored in field 
@@ -743,8 +451,23 @@ def mergevalues(obj_list, field):
     Returns:
         a list formed by merging corresponding lists from collection of subjects
     """
+    getter = compile_accessor(field)
     mergedlist = []
     for obj in obj_list:
-        mergedlist.extend(eval('obj.'+ field))
+        mergedlist.extend(getter(obj))
     return mergedlist
-    
\ No newline at end of file
+
+
+SCENE_VALIDITY_AGGREGATIONS = compile_aggregations([
+    ('largest_data_gap', 'max', 'largest_data_gap', None),
+    ('proportion_valid', 'weightedmean', 'proportion_valid', 'numsamples'),
+    ('proportion_valid_fix', 'weightedmean', 'proportion_valid_fix', 'numsamples')])
+"""aggregations over all the "Segment"s of a Scene (valid or not) that determine the validity of the Scene"""
+
+SCENE_AGGREGATIONS = compile_aggregations([
+    ('length', 'sum', 'length', None),
+    ('start', 'min', 'start', None),
+    ('end', 'max', 'end', None),
+    ('numsamples', 'sum', 'numsamples', None),
+    ('numfixations', 'sum', 'numfixations', None)])
+"""aggregations over the "Segment"s of a Scene that are used in calculating the Scene's features"""
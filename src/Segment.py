@@ -8,9 +8,10 @@ Created on 2011-08-26
 """
 import params
 import geometry
+import features
 from AOI import *
 from warnings import warn
-from AOI import AOI, _fixation_inside_aoi
+from AOI import AOI
 
 
 class Segment():
@@ -22,7 +23,8 @@ class Segment():
     Attributes:
         segid: A string containing the id of the Segment.
         alldata: A list of "Datapoint"s for this Segment
-        features: A dict with feature names as its keys and feature values as its values 
+        features: A dict with feature names as its keys and feature values as its values. The features of
+            the groups in FEATURE_GROUPS are calculated on first access (see LazyFeatures)
         completion_time: An integer indicating total duration of the Segment in milliseconds
             minimum is 16 ms (length of one sample with 60Hz sampling rate (ms))
         start: An integer indicating the Segment's start time in milliseconds
@@ -45,10 +47,20 @@ class Segment():
         fixation_data: A list of "Fixation"s for this Segment
         fixation_start: timestamp of the first entry from list of "Fixation"s for this Segment
         fixation_end: timestamp of the last entry from list of "Fixation"s for this Segment
+        moments: A dict of "Moments" for the fixation durations, saccade distances and angles, pupil sizes and distances from screen
         aoi_data: A list of AOI_Stat objects for relevant "AOI"s for this Segment
+        aoi_table: An AOIStatTable with the statistics of aoi_data, used for merging them into a Scene
+        transition_matrix: An AOITransitions with the transitions between the "AOI"s active during this Segment
+        aoi_samples: A dict with the ids of the active "AOI"s as keys and the number of valid gaze samples inside them as values
+        numgazesamples: An integer indicating the number of valid gaze samples in the Segment
         has_aois: A boolean indicating if this Segment has AOI features calculated for it
+        feature_inputs: A dict with the data needed by the feature groups that are not calculated yet, or None
+        pending_groups: A list of the names of the feature groups that are not calculated yet
+        on_demand_groups: A list of the names of the on-demand feature groups that are not calculated yet
+        discarded_groups: A list of the names of the feature groups that were given up without being calculated
         
     """
+
     def __init__(self, segid, all_data, fixation_data, event_data = None, aois = None, prune_length = None, rest_pupil_size = 0, export_pupilinfo = False):
         """
         Args:
@@ -70,7 +82,8 @@ class Segment():
         """
         self.segid = segid
         #self.alldata = all_data
-        self.features = {}
+        self.features = LazyFeatures(self.compute_feature_group)
+        self.moments = LazyFeatures(self.compute_feature_group)
         self.completion_time = all_data[-1].timestamp - all_data[0].timestamp
         if self.completion_time == 0:
             raise Exception("Zero length segment")
@@ -104,156 +117,145 @@ class Segment():
         self.features['numfixations'] = self.numfixations
         self.features['fixationrate'] = float(self.numfixations) / self.length
         
-        """ calculate pupil dilation features (no rest pupil size adjustments yet)""" 
-        self.rest_pupil_size = rest_pupil_size  
-        # check if pupil sizes are available for all missing points
-        pupil_invalid_data = filter(lambda x: x.pupilsize == -1 and x.gazepointxleft > 0, all_data)
-        if len(pupil_invalid_data) > 0:
-            raise Exception("Pupil size is unavailable for a valid data sample. Number of missing points: " + str(len(pupil_invalid_data)))
-        #get all pupil sizes (valid + invalid)
-        #pupilsizes = map(lambda x: x.pupilsize, all_data)
-        #get all datapoints where pupil size is available
-        valid_pupil_data = filter(lambda x: x.pupilsize != -1, all_data) 
-        
-        #number of valid pupil sizes
-        self.numpupilsizes = len(valid_pupil_data) 
-        if self.numpupilsizes > 0: #check if the current segment has pupil data available
-            self.adjvalidpupilsizes = map(lambda x: x.pupilsize - self.rest_pupil_size, valid_pupil_data)
-            """
-            #PCPS adjustment [Iqbal et al., 2005]
-            self.adjvalidpupilsizes = map(lambda x: (x.pupilsize - self.rest_pupil_size)/ (1.0 * self.rest_pupil_size), valid_pupil_data)
-            #for APCPS use self.features['meanpupilsize'] with PCPS adjustment
-            """
-            if export_pupilinfo:
-                self.pupilinfo_for_export = map(lambda x: [x.timestamp, x.pupilsize, x.pupilsize - self.rest_pupil_size], valid_pupil_data) 
-            
-            self.features['meanpupilsize'] = mean(self.adjvalidpupilsizes)
-            self.features['stddevpupilsize'] = stddev(self.adjvalidpupilsizes)
-            self.features['maxpupilsize'] = max(self.adjvalidpupilsizes)
-            self.features['minpupilsize'] = min(self.adjvalidpupilsizes)
-            self.features['startpupilsize'] = self.adjvalidpupilsizes[0]
-            self.features['endpupilsize'] = self.adjvalidpupilsizes[-1]
-        else:
-            self.adjvalidpupilsizes = []
-            self.features['meanpupilsize'] = 0
-            self.features['stddevpupilsize'] = 0
-            self.features['maxpupilsize'] = 0
-            self.features['minpupilsize'] = 0
-            self.features['startpupilsize'] = 0
-            self.features['endpupilsize'] = 0
-        """ end pupil """
-
-        """ calculate distance from screen features""" #distance
-                   
-        # check if pupil sizes are available for all missing points
-        invalid_distance_data = filter(lambda x: x.distance == -1 and x.gazepointxleft >= 0, all_data)
-        if len(invalid_distance_data) > 0:
-            warn("Distance from screen is unavailable for a valid data sample. Number of missing points: " + str(len(invalid_distance_data)))
-            
-        #get all datapoints where distance is available
-        valid_distance_data = filter(lambda x: x.distance != -1, all_data) 
-        
-        #number of valid pupil sizes
-        self.numdistances = len(valid_distance_data) 
-        if self.numdistances > 0: #check if the current segment has pupil data available
-            self.distances_from_screen = map(lambda x: x.distance, valid_distance_data)
-            self.features['meandistance'] = mean(self.distances_from_screen)
-            self.features['stddevdistance'] = stddev(self.distances_from_screen)
-            self.features['maxdistance'] = max(self.distances_from_screen)
-            self.features['mindistance'] = min(self.distances_from_screen)
-            self.features['startdistance'] = self.distances_from_screen[0]
-            self.features['enddistance'] = self.distances_from_screen[-1]
-        else:
-            self.features['meandistance'] = 0
-            self.features['stddevdistance'] = 0
-            self.features['maxdistance'] = 0
-            self.features['mindistance'] = 0
-            self.features['startdistance'] = 0
-            self.features['enddistance'] = 0
-        """ end distance """
-        
+        self.rest_pupil_size = rest_pupil_size
+        # check if pupil sizes are available for all valid points
+        missing = len(filter(lambda x: x.pupilsize == -1 and x.gazepointxleft > 0, all_data))
+        if missing > 0:
+            raise Exception("Pupil size is unavailable for a valid data sample. Number of missing points: " + str(missing))
+
         if self.numfixations > 0:
             self.fixation_start = fixation_data[0].timestamp
             self.fixation_end = fixation_data[-1].timestamp
-            self.features['meanfixationduration'] = mean(map(lambda x: float(x.fixationduration), fixation_data))
-            self.features['stddevfixationduration'] = stddev(map(lambda x: float(x.fixationduration), fixation_data))
-            self.features['sumfixationduration'] = sum(map(lambda x: x.fixationduration, fixation_data))
-            self.features['fixationrate'] = float(self.numfixations)/self.length
-            distances = self.calc_distances(fixation_data)
-            abs_angles = self.calc_abs_angles(fixation_data)
-            rel_angles = self.calc_rel_angles(fixation_data)
         else:
             self.fixation_start = -1
-            self.fixation_end = -1            
-            self.features['meanfixationduration'] = 0
-            self.features['stddevfixationduration'] = 0
-            self.features['sumfixationduration'] = 0
-            self.features['fixationrate'] = 0
-            distances = []
-        if len(distances) > 0:
-            self.features['meanpathdistance'] = mean(distances)
-            self.features['sumpathdistance'] = sum(distances)
-            self.features['stddevpathdistance'] = stddev(distances)
-            self.features['eyemovementvelocity'] = self.features['sumpathdistance']/self.length
-            self.features['sumabspathangles'] = sum(abs_angles)
-            self.features['abspathanglesrate'] = sum(abs_angles)/self.length
-            self.features['meanabspathangles'] = mean(abs_angles)
-            self.features['stddevabspathangles'] = stddev(abs_angles)
-            self.features['sumrelpathangles'] = sum(rel_angles)
-            self.features['relpathanglesrate'] = sum(rel_angles)/self.length
-            self.features['meanrelpathangles'] = mean(rel_angles)
-            self.features['stddevrelpathangles'] = stddev(rel_angles)
+            self.fixation_end = -1
+
+        """ the remaining features are calculated per group on first access """
+        self.defer_feature_groups({'all_data': all_data, 'fixation_data': fixation_data, 'event_data': event_data,
+                                   'aois': aois, 'export_pupilinfo': export_pupilinfo})
+
+    def defer_feature_groups(self, inputs):
+        """Registers the feature groups of this Segment that are calculated on first access
+        
+        The groups are the "FeatureGroup"s registered in module features. A group is calculated the first time
+        one of its features, "Moments" or attributes is read, or when get_features plans it for an export.
+        The on-demand groups (e.g., 'heatmap') are only calculated when one of their attributes is read.
+        The intermediates that no pending group needs any more are released after each group, and once
+        every pending group is calculated, all the inputs but the ones of the remaining on-demand groups.
+        
+        Args:
+            inputs: a dict with the data the groups are calculated from
+        """
+        self.feature_inputs = inputs
+        self.pending_groups = []
+        self.on_demand_groups = []
+        self.discarded_groups = []
+        for group in features.FEATURE_GROUPS:
+            if not self.feature_group_applies(group):
+                for attr, value in group.defaults.iteritems():
+                    setattr(self, attr, value)
+            elif group.on_demand:
+                self.on_demand_groups.append(group.name)
+            else:
+                self.pending_groups.append(group.name)
+                self.features.defer(group.name, group.features)
+                self.moments.defer(group.name, group.moments)
+
+    def feature_group_applies(self, group):
+        """Returns True if all the inputs a FeatureGroup requires for a Segment are given
+        """
+        return all(map(lambda x: self.feature_inputs.get(x), group.required))
+
+    def get_group_inputs(self, group):
+        """Returns the names of the inputs and intermediates a FeatureGroup reads for a Segment
+        """
+        return group.inputs
+
+    def calc_feature_group(self, group):
+        """Runs the kernel of a FeatureGroup on this Segment, calculating the intermediates it declares if needed
+        """
+        inputs = {}
+        for name in group.inputs:
+            inputs[name] = features.get_intermediate(self, self.feature_inputs, name)
+        group.kernel(self, inputs)
+
+    def compute_feature_group(self, name):
+        """Calculates the features of a group if they are not calculated yet
+        
+        Args:
+            name: a string containing the name of the group, e.g., 'signal'
+        """
+        if name in self.pending_groups:
+            self.pending_groups.remove(name)
+        elif name in self.on_demand_groups:
+            self.on_demand_groups.remove(name)
         else:
-            self.features['meanpathdistance'] = 0
-            self.features['sumpathdistance'] = 0
-            self.features['stddevpathdistance'] = 0
-            self.features['eyemovementvelocity'] = 0
-            self.features['sumabspathangles'] = 0
-            self.features['abspathanglesrate'] = 0
-            self.features['meanabspathangles']= 0
-            self.features['stddevabspathangles']= 0
-            self.features['sumrelpathangles'] = 0
-            self.features['relpathanglesrate'] = 0
-            self.features['meanrelpathangles']= 0
-            self.features['stddevrelpathangles'] = 0
-			
-        if event_data != None:
-            (leftc, rightc, doublec, keyp) = generate_event_lists(event_data)
-			
-            self.numevents = len(leftc)+len(rightc)+len(doublec)+len(keyp)
-            self.features['numevents'] = self.numevents
-			
-            self.features['numleftclic'] = len(leftc)
-            self.features['numrightclic'] = len(rightc)
-            self.features['numdoubleclic'] = len(doublec)
-            self.features['numkeypressed'] = len(keyp)
-            self.features['leftclicrate'] = float(len(leftc))/self.length
-            self.features['rightclicrate'] = float(len(rightc))/self.length
-            self.features['doubleclicrate'] = float(len(doublec))/self.length
-            self.features['keypressedrate'] = float(len(keyp))/self.length
-            self.features['timetofirstleftclic'] = leftc[0].timestamp if len(leftc) > 0 else -1
-            self.features['timetofirstrightclic'] = rightc[0].timestamp if len(rightc) > 0 else -1
-            self.features['timetofirstdoubleclic'] = doublec[0].timestamp if len(doublec) > 0 else -1
-            self.features['timetofirstkeypressed'] = keyp[0].timestamp if len(keyp) > 0 else -1
+            return
+        self.calc_feature_group(features.get_feature_group(name))
+        self.release_feature_inputs()
+
+    def release_feature_inputs(self):
+        """Releases the inputs and intermediates that the groups not calculated yet do not need
+        
+        While some groups are pending only the intermediates are released, since the pending groups may still
+        calculate them from the inputs. feature_inputs is set to None once no group needs it.
+        """
+        needed = []
+        for name in self.pending_groups + self.on_demand_groups:
+            needed += self.get_group_inputs(features.get_feature_group(name))
+        if self.pending_groups:
+            released = features.INTERMEDIATES
         else:
-            self.features['numevents'] = 0
-            self.features['numleftclic'] = 0
-            self.features['numrightclic'] = 0
-            self.features['numdoubleclic'] = 0
-            self.features['numkeypressed'] = 0
-            self.features['leftclicrate'] = 0
-            self.features['rightclicrate'] = 0
-            self.features['doubleclicrate'] = 0
-            self.features['keypressedrate'] = 0
-            self.features['timetofirstleftclic'] = -1
-            self.features['timetofirstrightclic'] = -1
-            self.features['timetofirstdoubleclic'] = -1
-            self.features['timetofirstkeypressed'] = -1
-
-        self.has_aois = False
-        if aois:
-            self.set_aois(aois,fixation_data, event_data)
-            self.features['aoisequence'] = self.generate_aoi_sequence(fixation_data, aois)
+            released = self.feature_inputs.keys()
+        for name in released:
+            if name in self.feature_inputs and name not in needed:
+                del self.feature_inputs[name]
+        if not self.feature_inputs:
+            self.feature_inputs = None
+
+    def discard_feature_groups(self, names = None):
+        """Gives up the given pending feature groups, or all the pending feature groups if names is None
+        
+        The features and "Moments" of these groups are not available any more and their attributes are set
+        to the defaults of the groups, as if they did not apply to this Segment. The inputs that only
+        these groups need are released.
+        """
+        if names is None:
+            names = list(self.pending_groups)
+        for name in names:
+            if name not in self.pending_groups:
+                continue
+            self.pending_groups.remove(name)
+            self.discarded_groups.append(name)
+            self.features.discard(name)
+            self.moments.discard(name)
+            for attr, value in features.get_feature_group(name).defaults.iteritems():
+                setattr(self, attr, value)
+        if self.feature_inputs is not None:
+            self.release_feature_inputs()
+
+    def compute_feature_groups(self, names = None):
+        """Calculates the given feature groups, or all the pending feature groups if names is None
+        
+        The on-demand groups are only calculated if they are named.
+        """
+        if names is None:
+            names = list(self.pending_groups)
+        for name in names:
+            self.compute_feature_group(name)
+
+    def __getattr__(self, name):
+        group = features.get_attribute_group(name)
+        if group is not None and (group in self.__dict__.get('pending_groups', ()) or
+                                  group in self.__dict__.get('on_demand_groups', ())):
+            self.compute_feature_group(group)
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        self.compute_feature_groups()
+        return self.__dict__
 
     def set_indices(self,sample_st,sample_end,fix_st,fix_end,event_st=None,event_end=None):
         """Sets the index features
@@ -287,29 +289,59 @@ class Segment():
             return self.sample_start_ind, self.sample_end_ind, self.fixation_start_ind, self.fixation_end_ind, self.event_start_ind, self.event_end_ind
         raise Exception ('The indices values are accessed before setting the initial value in segement:'+self.segid+'!')
 
-    def set_aois(self, aois, fixation_data, event_data = None):
+    def set_aois(self, aois, fixation_data, event_data = None, membership = None, event_membership = None,
+                 transitions = None):
         """Sets the relevant "AOI"s for this Segment
         
         Args:
             fixation_data: The list of "Fixation"s which make up this Segment
             aois: a list of "AOI"s relevant to this Segment
+            membership: if not None, the fixation x AOI membership matrix of fixation_data for aois, as
+                returned by fixation_aoi_membership. It is calculated here if None
+            event_membership: if not None, the clic x AOI membership matrix of event_data for aois, as
+                returned by event_aoi_membership. It is calculated here if None
+            transitions: if not None, the AOITransitions of fixation_data for the active "AOI"s, as
+                returned by get_aoi_transitions. It is calculated here if None
         """
         
         if len(aois) == 0:
             warn("no AOIs passed to segment:"+self.segid)
-        active_aois=[]
-        for aoi in aois:
-            #print "checking:",aoi.aid
-            if aoi.is_active(self.fixation_start, self.fixation_end):
-                active_aois.append(aoi)
+        active_aois = get_active_aois(aois, self.fixation_start, self.fixation_end)
         if not(active_aois):
             msg = "no active AOIs passed to segment:%s start:%d end:%d" %(self.segid,self.start,self.end)
             warn(msg)
+        if membership is None and active_aois:
+            membership = fixation_aoi_membership(fixation_data, active_aois)
+        if event_membership is None and event_data != None and active_aois:
+            event_membership = event_aoi_membership(EventArrays(event_data), active_aois)
+        if transitions is None and active_aois:
+            transitions = AOITransitions(membership, map(lambda x: x.aid, active_aois))
         self.aoi_data = {}
         for aoi in active_aois:
-            aoistat = AOI_Stat(aoi, fixation_data, self.start, self.end, active_aois, event_data)
+            aoistat = AOI_Stat(aoi, fixation_data, self.start, self.end, active_aois, event_data, membership, transitions,
+                               event_membership)
             self.aoi_data[aoi.aid] = aoistat
             self.has_aois = True
+        self.aoi_table = AOIStatTable(aois).add_aoistats(self.aoi_data)
+
+    def get_aoi_transitions(self, aois, fixation_data, membership = None):
+        """Returns the transitions between the "AOI"s that are active during this Segment
+        
+        Args:
+            aois: a list of "AOI"s
+            fixation_data: The list of "Fixation"s which make up this Segment
+            membership: if not None, the fixation x AOI membership matrix of fixation_data for aois, as
+                returned by fixation_aoi_membership. It is calculated here if None
+        
+        Returns:
+            an AOITransitions object, or None if no AOI is active during this Segment
+        """
+        active_aois = get_active_aois(aois, self.fixation_start, self.fixation_end)
+        if not active_aois:
+            return None
+        if membership is None:
+            membership = fixation_aoi_membership(fixation_data, active_aois)
+        return AOITransitions(membership, map(lambda x: x.aid, active_aois))
 
     def calc_validity_proportion(self, all_data):
         """Calculates the proportion of "Datapoint"s which are valid.
@@ -442,25 +474,27 @@ class Segment():
         elif params.VALIDITY_METHOD == 3:
             return self.validity3
     
+    def calc_scanpath_geometry(self, fixdata):
+        """returns the saccade distances, absolute angles and relative angles of the scan path built by a sequence of "Fixation"s
+
+        Args:
+            fixdata: a list of "Fixation"s
+
+        Returns:
+            distances: a list of Euclidean distances between consecutive "Fixation"s
+            abs_angles: a list of absolute angles for the saccades in Radiant
+            rel_angles: a list of relative angles for the saccades in Radiant
+        """
+        return geometry.scanpath_geometry(map(lambda x: x.mappedfixationpointx, fixdata),
+                                          map(lambda x: x.mappedfixationpointy, fixdata))
+
     def calc_distances(self, fixdata):
         """returns the Euclidean distances between a sequence of "Fixation"s
     
         Args:
             fixdata: a list of "Fixation"s
         """
-        distances = []
-        lastx = fixdata[0].mappedfixationpointx
-        lasty = fixdata[0].mappedfixationpointy
-
-        for i in xrange(1, len(fixdata)):
-            x = fixdata[i].mappedfixationpointx
-            y = fixdata[i].mappedfixationpointy
-            dist = math.sqrt((x-lastx)**2 + (y-lasty)**2)
-            distances.append(dist)
-            lastx = x
-            lasty = y
-
-        return distances
+        return self.calc_scanpath_geometry(fixdata)[0]
 
     def calc_abs_angles(self, fixdata):
         """returns the absolute angles between a sequence of "Fixation"s that build a scan path.
@@ -473,19 +507,7 @@ class Segment():
         Returns:
             a list of absolute angles for the saccades formed by the given sequence of "Fixation"s in Radiant
         """
-        abs_angles = []
-        lastx = fixdata[0].mappedfixationpointx
-        lasty = fixdata[0].mappedfixationpointy
-
-        for i in xrange(1,len(fixdata)):
-            x = fixdata[i].mappedfixationpointx
-            y = fixdata[i].mappedfixationpointy
-            (dist, theta) = geometry.vector_difference((lastx,lasty), (x, y))
-            abs_angles.append(abs(theta))
-            lastx=x
-            lasty=y
-
-        return abs_angles
+        return self.calc_scanpath_geometry(fixdata)[1]
 
     def calc_rel_angles(self, fixdata):
         """returns the relative angles between a sequence of "Fixation"s that build a scan path in Radiant
@@ -498,23 +520,7 @@ class Segment():
         Returns:
             a list of relative angles for the saccades formed by the given sequence of "Fixation"s in Radiant
         """
-        rel_angles = []
-        lastx = fixdata[0].mappedfixationpointx
-        lasty = fixdata[0].mappedfixationpointy
-
-        for i in xrange(1, len(fixdata)-1):
-            x = fixdata[i].mappedfixationpointx
-            y = fixdata[i].mappedfixationpointy
-            nextx = fixdata[i+1].mappedfixationpointx
-            nexty = fixdata[i+1].mappedfixationpointy
-            (dist, theta) = geometry.vector_difference((x,y), (lastx, lasty))
-            (dist, nextheta) = geometry.vector_difference((x,y), (nextx, nexty))
-            theta = abs(theta-nextheta)
-            rel_angles.append(theta)
-            lastx=x
-            lasty=y
-
-        return rel_angles
+        return self.calc_scanpath_geometry(fixdata)[2]
 
     def calc_num_samples(self, all_data):
         """Returns the number of samples in the Segment
@@ -532,18 +538,28 @@ class Segment():
                 num += 1
         return num
 
-    def generate_aoi_sequence(self, fixdata, aois):
+    def generate_aoi_sequence(self, fixdata, aois, membership = None):
         """returns the sequence of AOI's where "Fixation"s occurred 
         Args:
             fixdata: a list of "Fixation"s
+            membership: if not None, the fixation x AOI membership matrix of fixdata for aois, as returned
+                by fixation_aoi_membership
         Returns:
-            a list of AOI names that correspond to the sequence of "Fixation" locations
+            an AOISequence of the AOI names that correspond to the sequence of "Fixation" locations
         """
-        sequence = []
-        for fix in fixdata:
-            for aoi in aois:
-                if _fixation_inside_aoi(fix, aoi.polyin, aoi.polyout) and aoi.is_active(fix.timestamp, fix.timestamp) :
-                    sequence.append(aoi.aid)
+        if membership is None:
+            membership = fixation_aoi_membership(fixdata, aois)
+        active = []
+        for aoi in aois:
+            #only the Fixations inside the AOI are checked against its activity intervals
+            inside = filter(lambda i: membership[aoi.aid][i], xrange(len(fixdata)))
+            is_active = aoi.is_active_at(map(lambda i: fixdata[i].timestamp, inside))
+            active.append(set(map(lambda (i, _): i, filter(lambda (i, act): act, zip(inside, is_active)))))
+        sequence = AOISequence(map(lambda aoi: aoi.aid, aois))
+        for i in xrange(len(fixdata)):
+            for aoi, fixations in zip(aois, active):
+                if i in fixations:
+                    sequence.append(aoi.aid, fixdata[i].fixationduration)
         return sequence
     
     def getid(self):
@@ -572,6 +588,15 @@ class Segment():
             featvals  = [0.00268522882294', '1529851', '1.60354714212']
         
         """ 
+        wants_aois = aoifeaturelist != [] or bool(aoifeaturelabels)
+        aoifeaturenames = aoifeaturelabels if aoifeaturelabels else aoifeaturelist
+        if featurelist == []:
+            self.compute_feature_groups(features.plan_feature_groups([], wants_aois, aoifeaturenames))
+        elif not featurelist:
+            self.compute_feature_groups(features.plan_feature_groups(None, wants_aois, aoifeaturenames))
+        else:
+            self.compute_feature_groups(features.plan_feature_groups(featurelist, wants_aois, aoifeaturenames))
+
         if featurelist == []:
             featnames = []
         elif not featurelist:       #include all features
@@ -579,7 +604,7 @@ class Segment():
         else:                       #a list of features was given
             featnames = []
             for name in featurelist:
-                if name in self.features.keys():
+                if name in self.features:
                     featnames.append(name)
                 else:
                     raise Exception('Segment %s has no such feature: %s'%(self.getid(),name))
@@ -588,7 +613,7 @@ class Segment():
 
         featvals = map(lambda x: self.features[x], featnames)
 
-        if self.has_aois:
+        if wants_aois and self.has_aois:
             for aid, aoi in self.aoi_data.iteritems():
                 if aoifeaturelabels:    #an exact list of aoifeatures was given 
                     anames, avals = aoi.get_features()
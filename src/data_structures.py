@@ -17,11 +17,13 @@ class Datapoint:
     Attributes:
         segid: a string indicating the Segment that this Datapoint belongs to
         is_valid: a boolean indicating whether this sample is valid
+        gazepointx: the x coordinate of the gaze point on the interface under study, or None
+        gazepointy: the y coordinate of the gaze point on the interface under study, or None
     
         Please refer to the Tobii manual for the description of the rest of the attributes
     """
 
-    def __init__(self, data):
+    def __init__(self, data, media_offset = (0, 0)):
         """
         Initializes a Datapoint from either a line of gaze data from "all-Data.tsv"
         or the equivalent data in array form.
@@ -29,6 +31,9 @@ class Datapoint:
         Args:
             tobii_line: a line of gaze data from "all-Data.tsv"
             data: An already parsed line of Tobii data
+            media_offset: the coordinates of the top left corner of the window
+                showing the interface under study. (0,0) if the interface was
+                in full screen (default value)
 
         Yields:
             a Datapoint object
@@ -40,8 +45,15 @@ class Datapoint:
         self.stimuliname = data.get("stimuliname", None)
         self.fixationindex = data.get("fixationindex", None)
         self.gazepointxleft = data.get("gazepointxleft", None)
+        self.gazepointx = data.get("gazepointx", None)
+        self.gazepointy = data.get("gazepointy", None)
         self.segid = None
 
+        if self.gazepointx is not None and self.gazepointy is not None:
+            (media_offset_x, media_offset_y) = media_offset
+            self.gazepointx -= media_offset_x
+            self.gazepointy -= media_offset_y
+
 
 class Fixation:
     """
@@ -0,0 +1,489 @@
+"""
+UBC Eye Movement Data Analysis Toolkit
+
+Registry of the groups of features that are calculated for "Segment"s and "Scene"s
+
+Each FeatureGroup declares the inputs it reads, the features, "Moments" and attributes it sets,
+a kernel that calculates it for a Segment and a merge rule that calculates it for a Scene from
+the Scene's "Segment"s. Inputs can be the data given to a Segment ('all_data', 'fixation_data',
+'event_data', 'aois', 'export_pupilinfo') or intermediates registered with register_intermediate(),
+which are calculated once per Segment and shared by all the groups that declare them.
+
+A new group of features is added by registering it here; Segment and Scene only plan and run
+the registered groups.
+"""
+from utils import *
+from warnings import warn
+from AOI import fixation_aoi_membership, event_aoi_membership, sample_aoi_membership, AOITransitions
+from heatmap import Heatmap, bin_fixations
+
+
+class FeatureGroup():
+    """A group of features that are calculated together
+
+    Attributes:
+        name: a string containing the name of the group
+        inputs: a list of the names of the inputs and intermediates read by the kernel
+        features: a list of the names of the features set by the group
+        moments: a list of the names of the "Moments" set by the group
+        attributes: a list of the names of the attributes set by the group
+        aoi_features: a list of the names of the AOI features the group sets in the AOI_Stat objects of
+            aoi_data; the group is only planned for an export that requests one of them
+        kernel: a function (segment, inputs) that calculates the group for a Segment, where inputs
+            is a dict with the declared inputs
+        merge: a function (scene, inputs) that calculates the group for a Scene from the inputs of
+            the Scene, i.e., its 'segments', 'event_data', 'aois' and 'export_pupilinfo'
+        scene_inputs: a list of the names of the inputs of the Scene read by merge
+        required: a list of the names of the inputs that must be given (not None or empty) for the
+            group to be calculated for a Segment
+        scene_required: as required, for a Scene
+        defaults: a dict of attribute values that are set when the group is not calculated
+        on_demand: a boolean indicating whether the group is only calculated when one of its attributes
+            is read; such a group is never planned for an export and does not hold the other inputs
+    """
+
+    def __init__(self, name, inputs, features, kernel, merge, moments = [], attributes = [],
+                 required = [], scene_required = None, defaults = {}, on_demand = False,
+                 scene_inputs = ['segments', 'event_data', 'aois', 'export_pupilinfo'], aoi_features = []):
+        """Inits FeatureGroup class
+
+        Yields:
+            a FeatureGroup object
+        """
+        self.name = name
+        self.inputs = inputs
+        self.features = features
+        self.moments = moments
+        self.attributes = attributes
+        self.kernel = kernel
+        self.merge = merge
+        self.required = required
+        self.scene_required = required if scene_required is None else scene_required
+        self.defaults = defaults
+        self.on_demand = on_demand
+        self.scene_inputs = scene_inputs
+        self.aoi_features = aoi_features
+
+
+FEATURE_GROUPS = []
+"""the registered "FeatureGroup"s in the order they are calculated"""
+
+INTERMEDIATES = {}
+"""the registered intermediates, a dict with their names as keys and functions (segment, inputs) as values"""
+
+_groups_by_name = {}
+_groups_by_attribute = {}
+
+
+def register_feature_group(group):
+    """Adds a FeatureGroup to the registry
+
+    Args:
+        group: a FeatureGroup object with a name that is not registered yet
+    """
+    if group.name in _groups_by_name:
+        raise Exception('Feature group %s is already registered' %(group.name))
+    FEATURE_GROUPS.append(group)
+    _groups_by_name[group.name] = group
+    for attr in group.attributes:
+        _groups_by_attribute[attr] = group.name
+
+def register_intermediate(name, function):
+    """Adds an intermediate that can be declared as input by "FeatureGroup"s
+
+    Args:
+        name: a string containing the name of the intermediate
+        function: a function (segment, inputs) that calculates the intermediate from the data given
+            to a Segment
+    """
+    INTERMEDIATES[name] = function
+
+def get_intermediate(seg, inputs, name):
+    """Returns an intermediate of a Segment, calculating it first if it is not in inputs yet
+    
+    Intermediates that are built on other intermediates use it to read them.
+    
+    Args:
+        seg: a Segment
+        inputs: the dict of the inputs and intermediates of the Segment
+        name: a string containing the name of the intermediate
+    """
+    if name not in inputs:
+        inputs[name] = INTERMEDIATES[name](seg, inputs)
+    return inputs[name]
+
+def get_feature_group(name):
+    """Returns the registered FeatureGroup with the given name
+    """
+    return _groups_by_name[name]
+
+def get_attribute_group(attr):
+    """Returns the name of the group that sets the given attribute, or None
+    """
+    return _groups_by_attribute.get(attr)
+
+def plan_feature_groups(featurenames = None, aois = False, aoifeaturenames = None):
+    """Returns the names of the groups that have to be calculated for a list of features
+
+    Args:
+        featurenames: if not None, a list of feature names. If None all the features are requested
+        aois: a boolean determining whether AOI features are requested as well
+        aoifeaturenames: if not None, a list of the requested AOI feature names, or of AOI feature labels
+            of the form [AOI name]_[feature name]. If None all the AOI features are requested
+
+    Returns:
+        a list of group names in the order they are registered. The on-demand groups are not planned;
+        they are calculated when one of their attributes is read
+    """
+    plan = []
+    for group in FEATURE_GROUPS:
+        if group.on_demand:
+            continue
+        elif 'aoi_data' in group.attributes:
+            if aois:
+                plan.append(group.name)
+        elif group.aoi_features:
+            if aois and (aoifeaturenames is None or
+                         filter(lambda x: _requests_aoi_feature(aoifeaturenames, x), group.aoi_features)):
+                plan.append(group.name)
+        elif featurenames is None or filter(lambda x: x in featurenames, group.features):
+            plan.append(group.name)
+    return plan
+
+def _requests_aoi_feature(aoifeaturenames, feature):
+    """Helper function of plan_feature_groups that checks if an AOI feature is in a list of names or labels
+    """
+    return filter(lambda x: x == feature or x.endswith('_' + feature), aoifeaturenames) != []
+
+
+def set_signal_features(obj):
+    """Sets the pupil size and distance from screen features of a Segment or Scene from its "Moments"
+    """
+    obj.numpupilsizes = obj.moments['pupilsize'].count
+    obj.numdistances = obj.moments['distance'].count
+    for feat in ['pupilsize', 'distance']:
+        m = obj.moments[feat]
+        if m.count > 0:
+            obj.features['mean' + feat] = m.mean()
+            obj.features['stddev' + feat] = m.stddev()
+            obj.features['max' + feat] = m.max
+            obj.features['min' + feat] = m.min
+            obj.features['start' + feat] = m.first
+            obj.features['end' + feat] = m.last
+        else:
+            for stat in ['mean', 'stddev', 'max', 'min', 'start', 'end']:
+                obj.features[stat + feat] = 0
+
+def set_path_features(obj):
+    """Sets the fixation duration and scan path features of a Segment or Scene from its "Moments"
+    """
+    fixations = obj.moments['fixationduration']
+    if fixations.count > 0:
+        obj.features['meanfixationduration'] = fixations.mean()
+        obj.features['stddevfixationduration'] = fixations.stddev()
+        obj.features['sumfixationduration'] = fixations.sum
+    else:
+        obj.features['meanfixationduration'] = 0
+        obj.features['stddevfixationduration'] = 0
+        obj.features['sumfixationduration'] = 0
+
+    if obj.moments['pathdistance'].count > 0:
+        for feat in ['pathdistance', 'abspathangles', 'relpathangles']:
+            obj.features['mean' + feat] = obj.moments[feat].mean()
+            obj.features['sum' + feat] = obj.moments[feat].sum
+            obj.features['stddev' + feat] = obj.moments[feat].stddev()
+        obj.features['eyemovementvelocity'] = obj.features['sumpathdistance']/obj.length
+        obj.features['abspathanglesrate'] = obj.features['sumabspathangles']/obj.length
+        obj.features['relpathanglesrate'] = obj.features['sumrelpathangles']/obj.length
+    else:
+        for feat in ['pathdistance', 'abspathangles', 'relpathangles']:
+            obj.features['mean' + feat] = 0
+            obj.features['sum' + feat] = 0
+            obj.features['stddev' + feat] = 0
+        obj.features['eyemovementvelocity'] = 0
+        obj.features['abspathanglesrate'] = 0
+        obj.features['relpathanglesrate'] = 0
+
+def set_event_features(obj, counts):
+    """Sets the mouse click and key press features of a Segment or Scene
+
+    Args:
+        counts: a dict with the number of events per type and the time of the first event per type
+            (-1 if there is none), or None if there are no event data
+    """
+    if counts is None:
+        for feat in ['numevents', 'numleftclic', 'numrightclic', 'numdoubleclic', 'numkeypressed',
+                     'leftclicrate', 'rightclicrate', 'doubleclicrate', 'keypressedrate']:
+            obj.features[feat] = 0
+        for feat in ['leftclic', 'rightclic', 'doubleclic', 'keypressed']:
+            obj.features['timetofirst' + feat] = -1
+        return
+    for feat in ['numevents', 'numleftclic', 'numrightclic', 'numdoubleclic', 'numkeypressed',
+                 'timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic', 'timetofirstkeypressed']:
+        obj.features[feat] = counts[feat]
+    for feat in ['leftclic', 'rightclic', 'doubleclic', 'keypressed']:
+        obj.features[feat + 'rate'] = float(counts['num' + feat])/obj.length
+
+def set_markov_features(obj):
+    """Sets the Markov chain features of a Segment or Scene from its transition_matrix
+    """
+    obj.features['stationaryentropy'] = obj.transition_matrix.get_stationary_entropy()
+    obj.features['transitionentropy'] = obj.transition_matrix.get_transition_entropy()
+    obj.features['selftransitionrate'] = obj.transition_matrix.get_self_transition_rate()
+
+
+def signal_kernel(seg, inputs):
+    """Calculates the pupil dilation and distance from screen features (no rest pupil size adjustments yet)
+    """
+    pupil, distance = calc_signal_stats(inputs['all_data'], seg.rest_pupil_size, inputs['export_pupilinfo'])
+    if distance['invalid'] > 0:
+        warn("Distance from screen is unavailable for a valid data sample. Number of missing points: " + str(distance['invalid']))
+    """
+    #PCPS adjustment [Iqbal et al., 2005]
+    adjusted pupil size = (x.pupilsize - self.rest_pupil_size)/ (1.0 * self.rest_pupil_size)
+    #for APCPS use self.features['meanpupilsize'] with PCPS adjustment
+    """
+    if inputs['export_pupilinfo']:
+        seg.pupilinfo_for_export = pupil['export']
+    seg.moments['pupilsize'] = pupil['moments']
+    seg.moments['distance'] = distance['moments']
+    set_signal_features(seg)
+
+def signal_merge(scene, inputs):
+    """Merges the pupil dilation and distance from screen statistics of the "Segment"s
+    """
+    segments = inputs['segments']
+    for feat in ['pupilsize', 'distance']:
+        scene.moments[feat] = merge_moments(map(lambda x: x.moments[feat], segments))
+    if inputs['export_pupilinfo']:
+        scene.pupilinfo_for_export = []
+        for seg in segments:
+            scene.pupilinfo_for_export.extend(seg.pupilinfo_for_export)
+    else:
+        scene.pupilinfo_for_export = []
+    set_signal_features(scene)
+
+def path_kernel(seg, inputs):
+    """Calculates the fixation duration and scan path features
+    """
+    distances, abs_angles, rel_angles = inputs['scanpath']
+    seg.moments['fixationduration'] = Moments(map(lambda x: x.fixationduration, inputs['fixation_data']))
+    seg.moments['pathdistance'] = Moments(distances)
+    seg.moments['abspathangles'] = Moments(abs_angles)
+    seg.moments['relpathangles'] = Moments(rel_angles)
+    set_path_features(seg)
+
+def path_merge(scene, inputs):
+    """Merges the fixation duration and scan path statistics of the "Segment"s
+    """
+    segments = inputs['segments']
+    for feat in ['fixationduration', 'pathdistance', 'abspathangles', 'relpathangles']:
+        scene.moments[feat] = merge_moments(map(lambda x: x.moments[feat], segments))
+    set_path_features(scene)
+
+def events_kernel(seg, inputs):
+    """Calculates the mouse click and key press features
+    """
+    if inputs['eventlists'] is None:
+        set_event_features(seg, None)
+        return
+    (leftc, rightc, doublec, keyp) = inputs['eventlists']
+    seg.numevents = len(leftc)+len(rightc)+len(doublec)+len(keyp)
+    counts = {'numevents': seg.numevents, 'numleftclic': len(leftc), 'numrightclic': len(rightc),
+              'numdoubleclic': len(doublec), 'numkeypressed': len(keyp)}
+    for feat, events in [('leftclic', leftc), ('rightclic', rightc), ('doubleclic', doublec), ('keypressed', keyp)]:
+        counts['timetofirst' + feat] = events[0].timestamp if len(events) > 0 else -1
+    set_event_features(seg, counts)
+
+def events_merge(scene, inputs):
+    """Merges the mouse click and key press features of the "Segment"s
+    """
+    if inputs['event_data'] != None:
+        set_event_features(scene, aggregate(inputs['segments'], SCENE_EVENT_AGGREGATIONS))
+    else:
+        set_event_features(scene, None)
+
+def aois_kernel(seg, inputs):
+    """Calculates the AOI_Stat objects of the "AOI"s relevant to a Segment
+    """
+    seg.has_aois = False
+    seg.set_aois(inputs['aois'], inputs['fixation_data'], inputs['event_data'], inputs['fixation_aoi_membership'],
+                 inputs['event_aoi_membership'], inputs['aoi_transitions'])
+
+def aois_merge(scene, inputs):
+    """Merges the AOI_Stat objects of the "Segment"s
+    """
+    scene.has_aois = False
+    scene.set_aois(inputs['segments'], inputs['aois'])
+
+def aoisamples_kernel(seg, inputs):
+    """Calculates the sample-level features of the AOI_Stat objects of a Segment from its valid gaze samples
+    """
+    gaze = inputs['gaze_arrays']
+    seg.numgazesamples = len(gaze)
+    seg.aoi_samples = {}
+    for aid, aoistat in seg.aoi_data.iteritems():
+        aoistat.set_sample_features(gaze, inputs['sample_aoi_membership'], seg.start, seg.end)
+        seg.aoi_samples[aid] = aoistat.features['numsamples']
+
+def aoisamples_merge(scene, inputs):
+    """Adds up the valid gaze samples inside the "AOI"s of the "Segment"s
+    """
+    scene.numgazesamples = 0
+    scene.aoi_samples = {}
+    for seg in inputs['segments']:
+        scene.numgazesamples += seg.numgazesamples
+        for aid, numsamples in seg.aoi_samples.iteritems():
+            scene.aoi_samples[aid] = scene.aoi_samples.get(aid, 0) + numsamples
+    for aid, numsamples in scene.aoi_samples.iteritems():
+        features = scene.aoi_data[aid].features
+        features['numsamples'] = numsamples
+        features['proportionsamples'] = float(numsamples)/scene.numgazesamples if scene.numgazesamples > 0 else 0
+
+def markov_kernel(seg, inputs):
+    """Calculates the Markov chain features of the transitions between "AOI"s
+    """
+    seg.transition_matrix = inputs['aoi_transitions'] or AOITransitions(None, [])
+    set_markov_features(seg)
+
+def markov_merge(scene, inputs):
+    """Adds up the transition matrices of the "Segment"s and calculates the Markov chain features
+    """
+    scene.transition_matrix = AOITransitions(None, map(lambda x: x.aid, inputs['aois'] or []))
+    for seg in inputs['segments']:
+        scene.transition_matrix.merge(seg.transition_matrix)
+    set_markov_features(scene)
+
+def heatmap_kernel(seg, inputs):
+    """Bins the "Fixation"s of a Segment into its fixation heatmap
+    """
+    seg.heatmap = bin_fixations(inputs['fixation_data'])
+
+def heatmap_merge(scene, inputs):
+    """Adds up the fixation heatmaps of the "Segment"s
+    """
+    scene.heatmap = Heatmap()
+    for seg in inputs['segments']:
+        scene.heatmap.add(seg.heatmap)
+
+def aoisequence_kernel(seg, inputs):
+    """Calculates the sequence of "AOI"s where the "Fixation"s of a Segment occurred
+    """
+    seg.features['aoisequence'] = seg.generate_aoi_sequence(inputs['fixation_data'], inputs['aois'],
+                                                            inputs['fixation_aoi_membership'])
+
+def aoisequence_merge(scene, inputs):
+    """Merges the AOI sequences of the "Segment"s
+    """
+    scene.features['aoisequence'] = scene.merge_aoisequences(inputs['segments'])
+
+
+def calc_scanpath_intermediate(seg, inputs):
+    """Returns the saccade distances, absolute angles and relative angles of the scan path of a Segment
+    """
+    if seg.numfixations > 0:
+        return seg.calc_scanpath_geometry(inputs['fixation_data'])
+    return [], [], []
+
+def calc_aoi_transitions(seg, inputs):
+    """Returns the AOITransitions of the "AOI"s active during a Segment, or None
+    """
+    if not inputs['aois']:
+        return None
+    return seg.get_aoi_transitions(inputs['aois'], inputs['fixation_data'],
+                                   get_intermediate(seg, inputs, 'fixation_aoi_membership'))
+
+def calc_gaze_arrays(seg, inputs):
+    """Returns the GazeArrays of the valid gaze samples of a Segment
+    """
+    return GazeArrays(inputs['all_data'])
+
+def calc_sample_aoi_membership(seg, inputs):
+    """Returns the gaze sample x AOI membership matrix of a Segment (see AOI.sample_aoi_membership), or None
+    """
+    if not inputs['aois']:
+        return None
+    return sample_aoi_membership(get_intermediate(seg, inputs, 'gaze_arrays'), inputs['aois'])
+
+def calc_event_arrays(seg, inputs):
+    """Returns the EventArrays of the "Event"s of a Segment, or None
+    """
+    if inputs['event_data'] != None:
+        return EventArrays(inputs['event_data'])
+    return None
+
+def calc_eventlists_intermediate(seg, inputs):
+    """Returns the lists of left clics, right clics, double clics and keys pressed of a Segment, or None
+    """
+    events = get_intermediate(seg, inputs, 'event_arrays')
+    if events is None:
+        return None
+    return tuple(map(lambda indices: map(lambda i: inputs['event_data'][i], indices), events.classify()))
+
+def calc_fixation_aoi_membership(seg, inputs):
+    """Returns the fixation x AOI membership matrix of a Segment (see AOI.fixation_aoi_membership)
+    """
+    return fixation_aoi_membership(inputs['fixation_data'], inputs['aois'])
+
+def calc_event_aoi_membership(seg, inputs):
+    """Returns the clic x AOI membership matrix of a Segment (see AOI.event_aoi_membership), or None
+    """
+    events = get_intermediate(seg, inputs, 'event_arrays')
+    if events is None or not inputs['aois']:
+        return None
+    return event_aoi_membership(events, inputs['aois'])
+
+
+SCENE_EVENT_AGGREGATIONS = compile_aggregations([
+    ('numevents', 'sum', "features['numevents']", None),
+    ('numleftclic', 'sum', "features['numleftclic']", None),
+    ('numrightclic', 'sum', "features['numrightclic']", None),
+    ('numdoubleclic', 'sum', "features['numdoubleclic']", None),
+    ('numkeypressed', 'sum', "features['numkeypressed']", None),
+    ('timetofirstleftclic', 'first', "features['timetofirstleftclic']", None),
+    ('timetofirstrightclic', 'first', "features['timetofirstrightclic']", None),
+    ('timetofirstdoubleclic', 'first', "features['timetofirstdoubleclic']", None),
+    ('timetofirstkeypressed', 'first', "features['timetofirstkeypressed']", None)])
+"""aggregations over the "Segment"s of a Scene that are used in calculating the Scene's event features"""
+
+
+register_intermediate('scanpath', calc_scanpath_intermediate)
+register_intermediate('event_arrays', calc_event_arrays)
+register_intermediate('eventlists', calc_eventlists_intermediate)
+register_intermediate('fixation_aoi_membership', calc_fixation_aoi_membership)
+register_intermediate('event_aoi_membership', calc_event_aoi_membership)
+register_intermediate('aoi_transitions', calc_aoi_transitions)
+register_intermediate('gaze_arrays', calc_gaze_arrays)
+register_intermediate('sample_aoi_membership', calc_sample_aoi_membership)
+
+register_feature_group(FeatureGroup('signal', ['all_data', 'export_pupilinfo'],
+    ['meanpupilsize', 'stddevpupilsize', 'maxpupilsize', 'minpupilsize', 'startpupilsize', 'endpupilsize',
+     'meandistance', 'stddevdistance', 'maxdistance', 'mindistance', 'startdistance', 'enddistance'],
+    signal_kernel, signal_merge, moments = ['pupilsize', 'distance'],
+    attributes = ['numpupilsizes', 'numdistances', 'pupilinfo_for_export']))
+register_feature_group(FeatureGroup('path', ['fixation_data', 'scanpath'],
+    ['meanfixationduration', 'stddevfixationduration', 'sumfixationduration',
+     'meanpathdistance', 'sumpathdistance', 'stddevpathdistance', 'eyemovementvelocity',
+     'meanabspathangles', 'sumabspathangles', 'stddevabspathangles', 'abspathanglesrate',
+     'meanrelpathangles', 'sumrelpathangles', 'stddevrelpathangles', 'relpathanglesrate'],
+    path_kernel, path_merge, moments = ['fixationduration', 'pathdistance', 'abspathangles', 'relpathangles']))
+register_feature_group(FeatureGroup('events', ['event_arrays', 'eventlists'],
+    ['numevents', 'numleftclic', 'numrightclic', 'numdoubleclic', 'numkeypressed',
+     'leftclicrate', 'rightclicrate', 'doubleclicrate', 'keypressedrate',
+     'timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic', 'timetofirstkeypressed'],
+    events_kernel, events_merge, attributes = ['numevents']))
+register_feature_group(FeatureGroup('aois', ['aois', 'fixation_data', 'event_data', 'fixation_aoi_membership',
+                                            'event_arrays', 'event_aoi_membership', 'aoi_transitions'],
+    [], aois_kernel, aois_merge, attributes = ['aoi_data', 'aoi_table', 'has_aois'],
+    required = ['aois'], defaults = {'has_aois': False}))
+register_feature_group(FeatureGroup('aoisamples', ['gaze_arrays', 'sample_aoi_membership'], [],
+    aoisamples_kernel, aoisamples_merge, attributes = ['aoi_samples', 'numgazesamples'],
+    required = ['aois'], aoi_features = ['numsamples', 'proportionsamples']))
+register_feature_group(FeatureGroup('aoisequence', ['aois', 'fixation_data', 'fixation_aoi_membership'],
+    ['aoisequence'], aoisequence_kernel, aoisequence_merge,
+    required = ['aois'], scene_required = []))
+register_feature_group(FeatureGroup('markov', ['aois', 'aoi_transitions'],
+    ['stationaryentropy', 'transitionentropy', 'selftransitionrate'], markov_kernel, markov_merge,
+    attributes = ['transition_matrix']))
+register_feature_group(FeatureGroup('heatmap', ['fixation_data'], [], heatmap_kernel, heatmap_merge,
+    attributes = ['heatmap'], on_demand = True, scene_inputs = ['segments']))
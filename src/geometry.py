@@ -54,6 +54,47 @@ def vector_difference(point1, point2):
 
     raise Exception()
 
+def scanpath_geometry(xs, ys):
+    """Returns the saccade lengths, absolute angles and relative angles of a scan path in one pass
+
+    The angles follow the sign conventions of vector_difference: a saccade with no horizontal
+    component has an angle of 0, a saccade with no vertical component has an angle of -pi/2 and
+    any other saccade has the angle given by atan2.
+
+    Args:
+        xs: a list of the x coordinates of consecutive fixations
+        ys: a list of the y coordinates of consecutive fixations
+
+    Returns:
+        distances: a list of the Euclidean lengths of the n-1 saccades
+        abs_angles: a list of the n-1 absolute angles between each saccade and the horizontal axis
+        rel_angles: a list of the n-2 angles between each saccade and the previous saccade
+    """
+    distances = []
+    abs_angles = []
+    rel_angles = []
+    sqrt = math.sqrt
+    atan2 = math.atan2
+    horizontal = -math.pi/2
+    back_theta = None
+    for i in xrange(1, len(xs)):
+        dx = xs[i] - xs[i-1]
+        dy = ys[i] - ys[i-1]
+        distances.append(sqrt(dx**2 + dy**2))
+        if dx == 0:
+            theta = next_back_theta = 0
+        elif dy == 0:
+            theta = next_back_theta = horizontal
+        else:
+            theta = atan2(dy, dx)
+            next_back_theta = atan2(-dy, -dx)
+        abs_angles.append(abs(theta))
+        if back_theta is not None:
+            rel_angles.append(abs(back_theta - theta))
+        back_theta = next_back_theta
+
+    return distances, abs_angles, rel_angles
+
 def vector2coords(mag, angle):
     return (mag*math.cos(angle), mag*math.sin(angle))
    
@@ -0,0 +1,183 @@
+"""
+UBC Eye Movement Data Analysis Toolkit
+
+Fixation density heatmaps
+
+A Heatmap is a grid of bins over the screen that holds the number of "Fixation"s in each bin, or their
+total duration. The heatmap of a Segment is binned once from its "Fixation"s; the heatmap of a Scene
+is the sum of the heatmaps of its "Segment"s and the heatmap of a group of "Scene"s (e.g., the same
+Scene for several participants) is the sum of theirs, so the raw "Fixation"s are binned only once.
+The heatmaps are summed unsmoothed and Gaussian smoothing is applied to the final map.
+"""
+from array import array
+import math
+import params
+
+
+class Heatmap():
+    """A grid of fixation counts or durations over the screen
+
+    Attributes:
+        width: the width of the screen in pixels
+        height: the height of the screen in pixels
+        binsize: the size of the (square) bins in pixels
+        weighted: a boolean indicating whether the bins hold fixation durations instead of fixation counts
+        nx: the number of columns of bins
+        ny: the number of rows of bins
+        values: an array of the nx * ny bins, row by row
+        numfixations: the number of "Fixation"s binned in the heatmap
+    """
+
+    def __init__(self, width = None, height = None, binsize = None, weighted = None):
+        """Inits Heatmap class with all the bins set to zero
+
+        Args:
+            width: the width of the screen in pixels, params.SCREEN_RESOLUTION if None
+            height: the height of the screen in pixels, params.SCREEN_RESOLUTION if None
+            binsize: the size of the bins in pixels, params.HEATMAP_BIN_SIZE if None
+            weighted: whether the bins hold fixation durations, params.HEATMAP_DURATION_WEIGHTED if None
+
+        Yields:
+            a Heatmap object
+        """
+        self.width = params.SCREEN_RESOLUTION[0] if width is None else width
+        self.height = params.SCREEN_RESOLUTION[1] if height is None else height
+        self.binsize = params.HEATMAP_BIN_SIZE if binsize is None else binsize
+        self.weighted = params.HEATMAP_DURATION_WEIGHTED if weighted is None else weighted
+        self.nx = int(math.ceil(self.width / float(self.binsize)))
+        self.ny = int(math.ceil(self.height / float(self.binsize)))
+        self.values = array('d', [0.0]) * (self.nx * self.ny)
+        self.numfixations = 0
+
+    def add_fixations(self, fixations):
+        """Bins a list of "Fixation"s; the ones outside the screen are ignored
+
+        Args:
+            fixations: a list of "Fixation"s
+
+        Returns:
+            this Heatmap object
+        """
+        values = self.values
+        binsize = float(self.binsize)
+        for fix in fixations:
+            x = fix.mappedfixationpointx
+            y = fix.mappedfixationpointy
+            if x is None or y is None or x < 0 or y < 0 or x >= self.width or y >= self.height:
+                continue
+            values[int(y / binsize) * self.nx + int(x / binsize)] += fix.fixationduration if self.weighted else 1
+            self.numfixations += 1
+        return self
+
+    def add(self, other):
+        """Adds the bins of another Heatmap with the same grid to this one
+
+        Args:
+            other: a Heatmap object
+
+        Returns:
+            this Heatmap object
+        """
+        if (other.width, other.height, other.binsize, other.weighted) != (self.width, self.height, self.binsize, self.weighted):
+            raise Exception('Heatmaps with different grids cannot be added')
+        values = self.values
+        ovalues = other.values
+        for i in xrange(len(values)):
+            values[i] += ovalues[i]
+        self.numfixations += other.numfixations
+        return self
+
+    def get_total(self):
+        """Returns the sum of the bins
+        """
+        return sum(self.values)
+
+    def smooth(self, sigma = None):
+        """Returns a copy of this Heatmap smoothed with a Gaussian filter
+
+        The filter is applied to the rows and then to the columns of bins, truncated at 3 sigma and at
+        the borders of the screen.
+
+        Args:
+            sigma: the standard deviation of the filter in bins, params.HEATMAP_SIGMA if None
+
+        Returns:
+            a new Heatmap object
+        """
+        if sigma is None:
+            sigma = params.HEATMAP_SIGMA
+        smoothed = Heatmap(self.width, self.height, self.binsize, self.weighted)
+        smoothed.numfixations = self.numfixations
+        if sigma <= 0:
+            smoothed.values = array('d', self.values)
+            return smoothed
+        kernel = gaussian_kernel(sigma)
+        rows = _convolve(self.values, kernel, self.nx, self.ny, 1, self.nx)
+        smoothed.values = _convolve(rows, kernel, self.ny, self.nx, self.nx, 1)
+        return smoothed
+
+    def to_rows(self):
+        """Returns the bins as a list of ny rows of nx values
+        """
+        return map(lambda r: list(self.values[r * self.nx:(r + 1) * self.nx]), xrange(self.ny))
+
+
+def gaussian_kernel(sigma):
+    """Returns a normalized 1D Gaussian kernel truncated at 3 sigma
+
+    Args:
+        sigma: the standard deviation of the kernel in bins
+
+    Returns:
+        a list of 2 * radius + 1 weights that add up to 1
+    """
+    radius = int(math.ceil(3 * sigma))
+    weights = map(lambda d: math.exp(-0.5 * (d / float(sigma)) ** 2), xrange(-radius, radius + 1))
+    total = sum(weights)
+    return map(lambda w: w / total, weights)
+
+def _convolve(values, kernel, length, count, step, stride):
+    """Helper function that convolves count lines of length bins of a flat grid with a kernel
+
+    Line k starts at bin k * stride and its bins are step apart.
+    """
+    radius = len(kernel) // 2
+    result = array('d', [0.0]) * len(values)
+    for k in xrange(count):
+        base = k * stride
+        for i in xrange(length):
+            v = values[base + i * step]
+            if v == 0:
+                continue
+            for d in xrange(max(-radius, -i), min(radius, length - 1 - i) + 1):
+                result[base + (i + d) * step] += v * kernel[d + radius]
+    return result
+
+def bin_fixations(fixations):
+    """Returns the Heatmap of a list of "Fixation"s with the grid defined in params
+
+    Args:
+        fixations: a list of "Fixation"s
+    """
+    return Heatmap().add_fixations(fixations)
+
+def group_heatmap(objs, sigma = None):
+    """Returns the smoothed sum of the heatmaps of a group of "Segment"s or "Scene"s
+
+    The heatmap of each Segment or Scene is binned once and kept, so building the maps of several groups
+    that share "Scene"s does not bin their "Fixation"s again.
+
+    Args:
+        objs: a list of "Segment"s or "Scene"s
+        sigma: the standard deviation of the smoothing filter in bins, params.HEATMAP_SIGMA if None
+
+    Returns:
+        a Heatmap object
+    """
+    heatmaps = map(lambda obj: obj.heatmap, objs)
+    if not heatmaps:
+        return Heatmap()
+    total = Heatmap(heatmaps[0].width, heatmaps[0].height, heatmaps[0].binsize, heatmaps[0].weighted)
+    for heatmap in heatmaps:
+        total.add(heatmap)
+    return total.smooth(sigma)
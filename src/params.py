@@ -69,13 +69,25 @@ featurelist.extend(['numevents', 'numleftclic', 'numrightclic', 'numdoubleclic',
 # list of non-AOI feature names
 aoisequencefeat = ['aoisequence']
 
+AOI_SEQUENCE_FORMAT = 'list'
+#the format of the exported AOI sequences: 'list' for the list of the AOI of each Fixation, or 'rle' for
+#the runs of Fixations in the same AOI, exported as AOI,number of Fixations,total duration separated by ';'
+
+markovfeat = ['stationaryentropy', 'transitionentropy', 'selftransitionrate']
+#list of the Markov chain features of the transitions between AOIs
+
 # AOI sequence feature
 aoigeneralfeat = ['fixationrate','numfixations','totaltimespent','proportionnum',
                   'proportiontime','longestfixation', 'timetofirstfixation','timetolastfixation',
 				  'numevents', 'numleftclic', 'numrightclic', 'numdoubleclic', 'leftclicrate', 'rightclicrate', 'doubleclicrate',
-                  'timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic']
+                  'timetofirstleftclic', 'timetofirstrightclic', 'timetofirstdoubleclic',
+                  'numvisits', 'numrevisits', 'dwelltime', 'meanvisitduration']
 
 #list of general AOI features
+
+aoisamplefeat = ['numsamples', 'proportionsamples']
+#list of the AOI features calculated from the valid gaze samples, only calculated when they are requested
+
 aoinames = ['Top','Bottom','Graph','Toolbar','Test']
 #list of the AOI names
 
@@ -150,4 +162,39 @@ NONTEMP_FEATURES_AOI = ['longestfixation', 'proportionnum', 'proportiontime',
 NONTEMP_FEATUES_PUPIL = ['meanpupilsize', 'stddevpupilsize', 'maxpupilsize', 'minpupilsize', 'startpupilsize','endpupilsize']
 
 #list of features related to the participant's distance from the screen (in mm)
-NONTEMP_FEATURES_DISTANCE = ['meandistance', 'stddevdistance', 'maxdistance', 'mindistance', 'startdistance', 'enddistance']
\ No newline at end of file
+NONTEMP_FEATURES_DISTANCE = ['meandistance', 'stddevdistance', 'maxdistance', 'mindistance', 'startdistance', 'enddistance']
+AOI_GRID_MIN_AOIS = 16
+#the minimum number of AOIs for which the fixations are hit-tested through a uniform grid over the
+#screen instead of against every AOI. Set to None to always test every AOI
+
+AOI_GRID_CELL_SIZE = 100
+#the width and height (in pixels) of the cells of the AOI grid
+
+AOI_LABEL_MAP = False
+#if True, static AOIs (AOIs without time intervals) are rasterized into a label map of the screen and
+#the fixations are hit-tested with a lookup in the map instead of against the polygons
+
+SCREEN_RESOLUTION = (1280, 1024)
+#the width and height (in pixels) of the screen, the size of the AOI label maps
+
+AOI_LABEL_MAP_FOLDER = "./outputfolder/aoimaps"
+#the folder where the AOI label maps are cached, so the AOIs of an AOI file are rasterized only once
+#for all participants and processes. Set to None to keep the label maps in memory only
+
+HEATMAP_BIN_SIZE = 20
+#the width and height (in pixels) of the bins of the fixation heatmaps
+
+HEATMAP_DURATION_WEIGHTED = False
+#if True, the bins of the fixation heatmaps hold the total duration of the fixations instead of their number
+
+HEATMAP_SIGMA = 1.5
+#the standard deviation (in bins) of the Gaussian filter used to smooth the fixation heatmaps
+
+SCENE_PROCESSES = None
+#if larger than 1, the number of processes that compute the scenes of one participant in parallel
+#(see Recording.process_rec). Useful with few participants and many scenes
+
+SCENE_FEATURE_GROUPS = None
+#if not None, the names of the feature groups calculated by the SCENE_PROCESSES processes, e.g.,
+#features.plan_feature_groups(featurelist, True, aoigeneralfeat). The features of the other groups are
+#not available. If None, the processes calculate all the feature groups
@@ -0,0 +1,278 @@
+"""
+UBC Eye Movement Data Analysis Toolkit
+
+Comparison of scan paths as sequences of "AOI"s
+
+The sequences are compared as lists of integer AOI codes: the AOI sequences of the participants
+(see AOI.AOISequence) are first encoded with a shared AOI dictionary by encode_sequences().
+The distances are edit distances between these lists:
+    levenshtein: the minimum number of insertions, deletions and substitutions, computed with the
+        bit-parallel algorithm of Myers and Hyyro, or in a band of the DP table if max_distance is given
+    normalized_levenshtein: levenshtein divided by the length of the longest sequence
+    needleman_wunsch: the score of the best global alignment (a similarity, higher is closer)
+similarity_matrix() computes a metric for all the pairs of a list of sequences, over a pool of
+processes if asked, and scene_similarity_matrix() does it for the AOI sequences of one Scene of
+a list of "Participant"s, keeping the matrices of the scenes already compared.
+"""
+from multiprocessing import Pool
+
+
+def encode_sequences(sequences):
+    """Returns a list of AOI sequences as lists of integer codes of a shared AOI dictionary
+
+    Args:
+        sequences: a list of AOISequence objects or lists of AOI ids
+
+    Returns:
+        codes: a list with one list of integers per sequence
+        aids: the shared AOI dictionary, a list of AOI ids where code i stands for aids[i]
+    """
+    aids = []
+    index = {}
+    codes = []
+    for sequence in sequences:
+        if hasattr(sequence, 'codes'):
+            dictionary = map(lambda aid: _get_code(aid, aids, index), sequence.aids)
+            codes.append(map(lambda c: dictionary[c], sequence.codes))
+        else:
+            codes.append(map(lambda aid: _get_code(aid, aids, index), sequence))
+    return codes, aids
+
+def _get_code(aid, aids, index):
+    if aid not in index:
+        index[aid] = len(aids)
+        aids.append(aid)
+    return index[aid]
+
+def levenshtein(a, b, max_distance = None):
+    """Returns the Levenshtein distance between two sequences
+
+    Without max_distance, the distance is computed with the bit-parallel algorithm of Myers (1999) as
+    extended to edit distance by Hyyro (2001): one column of the DP table is held in the bits of two
+    integers, so each element of the longer sequence costs a few integer operations.
+    With max_distance, only the cells of the DP table at most max_distance away from its diagonal are
+    computed (Ukkonen's band).
+
+    Args:
+        a: a list of integer codes (or any hashable values)
+        b: a list of integer codes
+        max_distance: if not None, the largest distance of interest
+
+    Returns:
+        the number of insertions, deletions and substitutions to change a into b. With max_distance,
+        max_distance + 1 if the distance is larger than max_distance
+    """
+    if max_distance is not None:
+        return _banded_levenshtein(a, b, max_distance)
+    if len(a) > len(b):
+        a, b = b, a
+    m = len(a)
+    if m == 0:
+        return len(b)
+    peq = {}
+    for i in xrange(m):
+        peq[a[i]] = peq.get(a[i], 0) | (1 << i)
+    full = (1 << m) - 1
+    top = 1 << (m - 1)
+    pv = full
+    mv = 0
+    score = m
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & top:
+            score += 1
+        elif mh & top:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+    return score
+
+def _banded_levenshtein(a, b, max_distance):
+    """Helper function of levenshtein that computes the DP table in a band around its diagonal
+    """
+    m = len(a)
+    n = len(b)
+    if abs(m - n) > max_distance:
+        return max_distance + 1
+    big = max_distance + 1
+    prev = map(lambda j: j if j <= max_distance else big, xrange(n + 1))
+    for i in xrange(1, m + 1):
+        lo = max(1, i - max_distance)
+        hi = min(n, i + max_distance)
+        row = [big] * (n + 1)
+        row[0] = i if i <= max_distance else big
+        ai = a[i-1]
+        best = row[0] if lo == 1 else big
+        for j in xrange(lo, hi + 1):
+            cost = prev[j-1] + (ai != b[j-1])
+            if prev[j] + 1 < cost:
+                cost = prev[j] + 1
+            if row[j-1] + 1 < cost:
+                cost = row[j-1] + 1
+            row[j] = min(cost, big)
+            if row[j] < best:
+                best = row[j]
+        if best > max_distance:
+            return big
+        prev = row
+    return prev[n]
+
+def normalized_levenshtein(a, b, max_distance = None):
+    """Returns the Levenshtein distance between two sequences divided by the length of the longest one
+
+    Args:
+        a: a list of integer codes
+        b: a list of integer codes
+        max_distance: if not None, the largest (not normalized) distance of interest, see levenshtein
+
+    Returns:
+        a float between 0 (same sequences) and 1, 0.0 if both sequences are empty
+    """
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 0.0
+    return levenshtein(a, b, max_distance) / float(longest)
+
+def needleman_wunsch(a, b, match = 1, mismatch = -1, gap = -1, band = None):
+    """Returns the score of the best global alignment of two sequences (Needleman-Wunsch)
+
+    Args:
+        a: a list of integer codes
+        b: a list of integer codes
+        match: the score of aligning two equal elements
+        mismatch: the score of aligning two different elements
+        gap: the score of aligning an element with a gap
+        band: if not None, only the alignments that stay within band cells of the diagonal of the
+            DP table (plus the difference of the lengths of the sequences) are considered
+
+    Returns:
+        the score of the best alignment
+    """
+    m = len(a)
+    n = len(b)
+    if band is not None:
+        band = band + abs(m - n)
+    outside = float('-inf')
+    prev = map(lambda j: j * gap if band is None or j <= band else outside, xrange(n + 1))
+    for i in xrange(1, m + 1):
+        lo, hi = 1, n
+        if band is not None:
+            lo = max(1, i - band)
+            hi = min(n, i + band)
+        row = [outside] * (n + 1)
+        row[0] = i * gap if band is None or i <= band else outside
+        ai = a[i-1]
+        for j in xrange(lo, hi + 1):
+            score = prev[j-1] + (match if ai == b[j-1] else mismatch)
+            if prev[j] + gap > score:
+                score = prev[j] + gap
+            if row[j-1] + gap > score:
+                score = row[j-1] + gap
+            row[j] = score
+        prev = row
+    return prev[n]
+
+METRICS = {'levenshtein': levenshtein,
+           'normalized_levenshtein': normalized_levenshtein,
+           'needleman_wunsch': needleman_wunsch}
+"""the metrics that can be used in similarity_matrix, by name"""
+
+
+_worker_sequences = None
+_worker_metric = None
+_worker_options = None
+
+def _init_worker(sequences, metric, options):
+    """Helper function that gives the sequences to a process of the pool once, instead of with every task
+    """
+    global _worker_sequences, _worker_metric, _worker_options
+    _worker_sequences = sequences
+    _worker_metric = metric
+    _worker_options = options
+
+def _row(i):
+    """Helper function that returns the values of the metric between sequence i and the sequences after it
+    """
+    metric = METRICS[_worker_metric]
+    a = _worker_sequences[i]
+    return map(lambda b: metric(a, b, **_worker_options), _worker_sequences[i+1:])
+
+def similarity_matrix(sequences, metric = 'levenshtein', processes = None, **options):
+    """Returns the matrix of a metric between all the pairs of a list of AOI sequences
+
+    Args:
+        sequences: a list of AOISequence objects, lists of AOI ids or lists of integer codes
+        metric: the name of a metric of METRICS
+        processes: if larger than 1, the number of processes computing the rows of the matrix in parallel
+        options: the keyword arguments of the metric, e.g., max_distance or band
+
+    Returns:
+        a list of lists, where matrix[i][j] is the metric between sequences i and j
+    """
+    if metric not in METRICS:
+        raise Exception('Unknown scan path metric: %s' %(metric))
+    codes, _ = encode_sequences(sequences)
+    n = len(codes)
+    if processes is not None and processes > 1 and n > 2:
+        pool = Pool(processes, _init_worker, (codes, metric, options))
+        try:
+            rows = pool.map(_row, xrange(n))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_worker(codes, metric, options)
+        rows = map(_row, xrange(n))
+        _init_worker(None, None, None)
+    function = METRICS[metric]
+    matrix = map(lambda i: [None] * n, xrange(n))
+    for i in xrange(n):
+        matrix[i][i] = function(codes[i], codes[i], **options)
+        for k, value in enumerate(rows[i]):
+            matrix[i][i+1+k] = value
+            matrix[i+1+k][i] = value
+    return matrix
+
+_scene_matrices = {}
+"""the matrices computed by scene_similarity_matrix, keyed by the scene, the participants and the metric"""
+
+def scene_similarity_matrix(participants, scid, metric = 'levenshtein', processes = None, **options):
+    """Returns the matrix of a metric between the AOI sequences of the participants in one Scene
+
+    The matrix of a scene is computed once for the same participants, metric and options; later calls
+    return it from the cache until clear_similarity_cache() is called.
+
+    Args:
+        participants: a list of "Participant"s
+        scid: the id of the Scene to compare
+        metric: the name of a metric of METRICS
+        processes: if larger than 1, the number of processes used to compute the matrix
+        options: the keyword arguments of the metric
+
+    Returns:
+        pids: the ids of the participants that have the Scene with an AOI sequence, in the order of the matrix
+        matrix: a list of lists, where matrix[i][j] is the metric between participants pids[i] and pids[j]
+    """
+    pids = []
+    sequences = []
+    for p in participants:
+        for sc in p.scenes:
+            if sc.scid == scid and 'aoisequence' in sc.features:
+                pids.append(p.pid)
+                sequences.append(sc.features['aoisequence'])
+                break
+    key = (scid, tuple(pids), metric, tuple(sorted(options.items())))
+    if key not in _scene_matrices:
+        _scene_matrices[key] = similarity_matrix(sequences, metric, processes, **options)
+    return pids, _scene_matrices[key]
+
+def clear_similarity_cache():
+    """Forgets the matrices computed by scene_similarity_matrix
+    """
+    _scene_matrices.clear()
@@ -21,8 +21,10 @@ class SMIRecording(Recording.Recording):
                         "is_valid": True,  # temporarily set to true for all
                         "stimuliname": "Screen",  # temporarily set to the same stimuli
                         "fixationindex": utils.cast_int(row["Time"]),
-                        "gazepointxleft": utils.cast_float(row["L POR X [px]"])}
-                all_data.append(Datapoint(data))
+                        "gazepointxleft": utils.cast_float(row["L POR X [px]"]),
+                        "gazepointx": utils.cast_float(row["L POR X [px]"]),
+                        "gazepointy": utils.cast_float(row["L POR Y [px]"])}
+                all_data.append(Datapoint(data, self.media_offset))
 
         return all_data
 
@@ -5,8 +5,8 @@ Created on 2012-08-23; updated on 2014-5-25
 '''
 from BasicParticipant import *
 from Participant import export_features_all, write_features_tsv
+from Recording import read_aois
 from ValidityProcessing import output_Validity_info_Segments, output_percent_discarded, output_Validity_info_Participants
-from EMDAT_multipleAOIs_wrapper import *
 
 ul =        [61, 62]    # list of user recordings (files extracted for one participant from Tobii studio)
 uids =      [61, 62]    # User ID that is used in the external logs (can be different from above but there should be a 1-1 mapping)
@@ -21,9 +21,8 @@ alogoffset =[ 3,  2]    # the time sifference between the eye tracker logs and t
 
 
 ###### Composite AOIs
-sample_aoi_file="./sampledata/Simple composite aois.aoi"
-composite_aoi_file="./sampledata/out_test.aoi"
-params.aoinames=init_composite_AOIs(sample_aoi_file, composite_aoi_file)
+composite_aoi_file="./sampledata/Simple composite aois.aoi"
+params.aoinames=map(lambda aoi: aoi.aid, read_aois(composite_aoi_file))
 print params.aoinames
 
 ###### Read participants
@@ -49,8 +48,6 @@ aoi_feat_names = (map(lambda x:x, params.aoigeneralfeat))
 print "exporting:", params.featurelist, "\n", aoi_feat_names
 write_features_tsv(ps, './outputfolder/sample_features.tsv',featurelist = params.featurelist, aoifeaturelist=aoi_feat_names, id_prefix = False)
 
-postprocess_composite_AOIs('./outputfolder/sample_features.tsv', params.aoinames, aoi_feat_names)
-
 #print "exporting:", params.featurelist, "\n", aoi_feat_names
 #write_features_tsv(ps, './Data/Bar-Radar/outputfolder/sample_features.tsv',featurelist = params.featurelist, aoifeaturelist=aoi_feat_names, id_prefix = False)
 #write_features_tsv(ps, './Data/Bar-Radar/outputfolder/sample_sequences.tsv',featurelist = params.aoisequencefeat, aoifeaturelabels=aoi_feat_names, id_prefix = False)
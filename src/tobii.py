@@ -33,8 +33,10 @@ class TobiiRecording(Recording.Recording):
                         "is_valid": utils.cast_int(row["ValidityRight"]) < 2 or utils.cast_int(row["ValidityLeft"]) < 2,
                         "stimuliname": row["StimuliName"],
                         "fixationindex": utils.cast_int(row["FixationIndex"]),
-                        "gazepointxleft": utils.cast_float(row["GazePointXLeft"])}
-                all_data.append(Datapoint(data))
+                        "gazepointxleft": utils.cast_float(row["GazePointXLeft"]),
+                        "gazepointx": utils.cast_int(row["MappedGazeDataPointX"]),
+                        "gazepointy": utils.cast_int(row["MappedGazeDataPointY"])}
+                all_data.append(Datapoint(data, self.media_offset))
 
         return all_data
 
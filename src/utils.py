@@ -9,6 +9,10 @@ Commonly used helper methods
 from data_structures import Fixation
 import params
 import math
+import re
+from array import array
+import bisect
+from operator import attrgetter, itemgetter
 
 
 def point_inside_polygon(x,y,poly):
@@ -43,6 +47,177 @@ def point_inside_polygon(x,y,poly):
 
     return inside   
 
+def points_inside_polygon(xs, ys, poly, exclude = None):
+    """Determines for a batch of points if each point is inside a given polygon or not
+    
+        The same "Ray Casting Method" rules as point_inside_polygon are used, so every point gets the
+        same result from both. The edges are prepared once for the whole batch and the points outside
+        the bounding box of the polygon are rejected without visiting the edges.
+        
+    Args:
+        xs: a list of the x coordinates of the points
+        ys: a list of the y coordinates of the points
+        poly: is a list of (x,y) pairs defining the polgon
+        exclude: optional list of (x,y) pairs defining a polygon whose points are not inside
+        
+    Returns:
+        a list of booleans, True for the points inside poly and not inside exclude
+    """
+    mask = _ray_casting(xs, ys, poly, xrange(len(xs)))
+    if exclude:
+        candidates = filter(lambda i: mask[i], xrange(len(mask)))
+        excluded = _ray_casting(xs, ys, exclude, candidates)
+        for i in candidates:
+            if excluded[i]:
+                mask[i] = False
+    return mask
+
+def points_inside_polygons(xs, ys, polys, excludes = []):
+    """Determines for a batch of points if each point is inside the union of several polygons or not
+    
+        A point is inside if it is inside at least one polygon of polys and inside no polygon of excludes,
+        with the same rules as points_inside_polygon for each polygon. Each point is only tested against
+        the next polygons of polys until it is found inside one.
+        
+    Args:
+        xs: a list of the x coordinates of the points
+        ys: a list of the y coordinates of the points
+        polys: a list of polygons, each a list of (x,y) pairs
+        excludes: a list of polygons whose points are not inside
+        
+    Returns:
+        a list of booleans, True for the points inside polys and not inside excludes
+    """
+    mask = [False] * len(xs)
+    candidates = range(len(xs))
+    for poly in polys:
+        if not candidates:
+            break
+        inside = _ray_casting(xs, ys, poly, candidates)
+        for i in candidates:
+            if inside[i]:
+                mask[i] = True
+        candidates = filter(lambda i: not inside[i], candidates)
+    for exclude in excludes:
+        candidates = filter(lambda i: mask[i], xrange(len(mask)))
+        if not candidates:
+            break
+        excluded = _ray_casting(xs, ys, exclude, candidates)
+        for i in candidates:
+            if excluded[i]:
+                mask[i] = False
+    return mask
+
+def polygon_spans(poly, width, height, exclude = None):
+    """Rasterizes a polygon over the pixels of a width x height screen
+    
+        Pixel (x, y) is covered if point_inside_polygon(x, y, poly) is True for the integer coordinates
+        x and y (and point_inside_polygon(x, y, exclude) is False), so a lookup in the raster gives the
+        same result as the "Ray Casting Method" for integer points. Each row is filled from the
+        crossings of its edges instead of testing every pixel.
+        
+    Args:
+        poly: is a list of (x,y) pairs defining the polgon
+        width: an integer, the number of pixels of a row
+        height: an integer, the number of rows
+        exclude: optional list of (x,y) pairs defining a polygon whose pixels are not covered
+        
+    Returns:
+        a list with, for each row, a sorted list of the (start, end) spans of covered pixels with end excluded
+    """
+    edges = _polygon_edges(poly)
+    excluded_edges = _polygon_edges(exclude) if exclude else []
+    rows = []
+    for y in xrange(height):
+        spans = _row_spans(edges, y, width)
+        if spans and excluded_edges:
+            spans = _subtract_spans(spans, _row_spans(excluded_edges, y, width))
+        rows.append(spans)
+    return rows
+
+def _row_spans(edges, y, width):
+    """Helper function of polygon_spans that returns the spans of row y inside the polygon of the given edges
+    """
+    breaks = []
+    for (ey1, ey2, ex2, p1x, p1y, dx, dy, vertical) in edges:
+        if y > ey1 and y <= ey2:
+            limit = ex2 if vertical else min(ex2, (y-p1y)*dx/dy+p1x)
+            #the integer x <= limit are the pixels before floor(limit)+1
+            breaks.append(min(max(int(math.floor(limit)) + 1, 0), width))
+    breaks.sort()
+    #a pixel is inside when an odd number of breaks are after it
+    spans = []
+    start = 0
+    n = len(breaks)
+    for k in xrange(n):
+        if (n - k) % 2 == 1 and breaks[k] > start:
+            spans.append((start, breaks[k]))
+        start = breaks[k]
+    return spans
+
+def _subtract_spans(spans, holes):
+    """Helper function of polygon_spans that removes the pixels of the spans holes from the spans spans
+    """
+    result = []
+    h = 0
+    for (start, end) in spans:
+        while h < len(holes) and holes[h][1] <= start:
+            h += 1
+        k = h
+        while k < len(holes) and holes[k][0] < end:
+            if holes[k][0] > start:
+                result.append((start, holes[k][0]))
+            start = max(start, holes[k][1])
+            k += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+def _polygon_edges(poly):
+    """Helper function that returns the non-horizontal edges of a polygon, prepared for the "Ray Casting Method"
+    
+    Returns:
+        a list of (miny, maxy, maxx, p1x, p1y, dx, dy, vertical) tuples
+    """
+    edges = []
+    n = len(poly)
+    if n==0:
+        return edges
+    p1x,p1y = poly[0]
+    for i in range(n+1):
+        p2x,p2y = poly[i % n]
+        if p1y != p2y:  #horizontal edges never flip the result
+            edges.append((min(p1y,p2y), max(p1y,p2y), max(p1x,p2x), p1x, p1y, p2x-p1x, p2y-p1y, p1x == p2x))
+        p1x,p1y = p2x,p2y
+    return edges
+
+def _ray_casting(xs, ys, poly, indices):
+    """Helper function of points_inside_polygon that tests the points at the given indices against one polygon
+    
+    Returns:
+        a list of booleans of the length of xs, False for the points that are not tested
+    """
+    mask = [False] * len(xs)
+    edges = _polygon_edges(poly)
+    if not edges:
+        return mask
+    miny = min(map(lambda e: e[0], edges))
+    maxy = max(map(lambda e: e[1], edges))
+    maxx = max(map(lambda e: e[2], edges))
+
+    for i in indices:
+        x = xs[i]
+        y = ys[i]
+        if not (y > miny and y <= maxy and x <= maxx):
+            continue
+        inside = False
+        for (ey1, ey2, ex2, p1x, p1y, dx, dy, vertical) in edges:
+            if y > ey1 and y <= ey2 and x <= ex2:
+                if vertical or x <= (y-p1y)*dx/dy+p1x:
+                    inside = not inside
+        mask[i] = inside
+    return mask
+
 def get_chunk(data, ind, start, end):
     """Returns index of first and last records in data that fall within a time interval (start-end) 
     Args:
@@ -147,6 +322,447 @@ def mean(data):
         return 0
     return sum(data) / float(len(data))
 
+def run_lengths(values):
+    """Returns the run-length encoding of a list
+    
+    Args:
+        values: a list of values that can be compared with ==
+    
+    returns:
+        a list of (value, start, length) tuples, one for each run of equal consecutive values, where start
+        is the index of the first value of the run in values
+    """
+    runs = []
+    start = 0
+    n = len(values)
+    while start < n:
+        value = values[start]
+        end = start + 1
+        while end < n and values[end] == value:
+            end += 1
+        runs.append((value, start, end - start))
+        start = end
+    return runs
+
+class Moments():
+    """Mergeable sufficient statistics of a stream of numbers
+
+    A Moments object keeps the count, sum, sum of squared deviations from the mean (M2), minimum,
+    maximum, first and last value of a stream. Two Moments objects can be merged with the Chan et al.
+    pairwise update, so the statistics of a Scene can be calculated from the statistics of its
+    "Segment"s without visiting the values again.
+
+    Attributes:
+        count: the number of values
+        sum: the sum of the values
+        m2: the sum of squared deviations of the values from their mean
+        min: the smallest value or None if the stream is empty
+        max: the largest value or None if the stream is empty
+        first: the first value or None if the stream is empty
+        last: the last value or None if the stream is empty
+    """
+
+    def __init__(self, values = None):
+        """Inits Moments class
+
+        Args:
+            values: If not None, a list of numbers used to initialize the statistics
+
+        Yields:
+            a Moments object
+        """
+        self.count = 0
+        self.sum = 0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.first = None
+        self.last = None
+        if values:
+            self.count = len(values)
+            self.sum = sum(values)
+            m = self.sum / float(self.count)
+            self.m2 = sum(map(lambda x: (x-m)**2, values))
+            self.min = min(values)
+            self.max = max(values)
+            self.first = values[0]
+            self.last = values[-1]
+
+    def add(self, value):
+        """Adds one value at the end of the stream using Welford's update
+
+        Args:
+            value: a number
+        """
+        if self.count == 0:
+            self.min = self.max = self.first = value
+        else:
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+        delta = value - self.mean()
+        self.count += 1
+        self.sum += value
+        self.m2 += delta * (value - self.mean())
+        self.last = value
+
+    def merge(self, other):
+        """Appends the stream summarized by another Moments object to this one
+
+        Args:
+            other: a Moments object for the values that follow the values of this object
+
+        Returns:
+            this Moments object
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.sum, self.m2 = other.count, other.sum, other.m2
+            self.min, self.max, self.first, self.last = other.min, other.max, other.first, other.last
+            return self
+        count = self.count + other.count
+        delta = other.mean() - self.mean()
+        self.m2 += other.m2 + delta**2 * self.count * other.count / float(count)
+        self.count = count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.last = other.last
+        return self
+
+    def mean(self):
+        """Returns the average of the values or 0 if the stream is empty
+        """
+        if self.count == 0:
+            return 0
+        return self.sum / float(self.count)
+
+    def stddev(self):
+        """Returns the sample standard deviation of the values or NAN if it is undefined
+        """
+        if self.count < 2:
+            return float('nan')
+        return math.sqrt(self.m2 / float(self.count - 1))
+
+
+class LazyFeatures(dict):
+    """A dict of features whose values are calculated in groups on first access
+
+    The names of the features of a group are registered with defer() before they are calculated.
+    The first time one of them is read, the given compute function is called with the name of its
+    group and is expected to set all the features of that group. The values are then kept like in a
+    normal dict, so every group is calculated at most once.
+
+    Methods that need all the values (keys(), items(), len(), iteration, ...) calculate all the
+    pending groups first. A pickled LazyFeatures object is restored as a plain dict.
+
+    Attributes:
+        compute: a function that takes the name of a group and sets all the features of that group
+        pending: a dict with the names of the features that are not calculated yet as keys and the
+            names of their groups as values
+    """
+
+    def __init__(self, compute):
+        """Inits LazyFeatures class
+
+        Args:
+            compute: a function that takes the name of a group and sets all the features of that group
+
+        Yields:
+            a LazyFeatures object
+        """
+        dict.__init__(self)
+        self.compute = compute
+        self.pending = {}
+
+    def defer(self, group, names):
+        """Registers the features of a group that will be calculated on first access
+
+        Args:
+            group: a string containing the name of the group
+            names: a list of feature names that are set when the group is calculated
+        """
+        for name in names:
+            if not dict.__contains__(self, name):
+                self.pending[name] = group
+
+    def discard(self, group):
+        """Forgets the features of a group that are not calculated yet, so they are not calculated any more
+
+        Args:
+            group: a string containing the name of the group
+        """
+        for name in [n for n, g in self.pending.iteritems() if g == group]:
+            del self.pending[name]
+
+    def resolve(self, name = None):
+        """Calculates the group of a pending feature, or all pending groups if name is None
+        """
+        if name is None:
+            while self.pending:
+                self._compute_group(self.pending.itervalues().next())
+        elif name in self.pending:
+            self._compute_group(self.pending[name])
+
+    def _compute_group(self, group):
+        self.compute(group)
+        for name in [n for n, g in self.pending.iteritems() if g == group]:
+            del self.pending[name]
+
+    def __missing__(self, name):
+        if name in self.pending:
+            self.resolve(name)
+            return dict.__getitem__(self, name)
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        self.pending.pop(name, None)
+        dict.__setitem__(self, name, value)
+
+    def __contains__(self, name):
+        return name in self.pending or dict.__contains__(self, name)
+
+    has_key = __contains__
+
+    def get(self, name, default = None):
+        self.resolve(name)
+        return dict.get(self, name, default)
+
+    def keys(self):
+        self.resolve()
+        return dict.keys(self)
+
+    def values(self):
+        self.resolve()
+        return dict.values(self)
+
+    def items(self):
+        self.resolve()
+        return dict.items(self)
+
+    def iterkeys(self):
+        self.resolve()
+        return dict.iterkeys(self)
+
+    def itervalues(self):
+        self.resolve()
+        return dict.itervalues(self)
+
+    def iteritems(self):
+        self.resolve()
+        return dict.iteritems(self)
+
+    def __iter__(self):
+        self.resolve()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.resolve()
+        return dict.__len__(self)
+
+    def copy(self):
+        self.resolve()
+        return dict(self)
+
+    def __reduce__(self):
+        self.resolve()
+        return (dict, (dict(self),))
+
+
+def merge_moments(moments_list):
+    """Returns a new Moments object that summarizes the concatenation of the given streams
+
+    Args:
+        moments_list: a list of Moments objects in stream order
+
+    Returns:
+        a Moments object
+    """
+    merged = Moments()
+    for m in moments_list:
+        merged.merge(m)
+    return merged
+
+def calc_signal_stats(all_data, rest_pupil_size = 0, export_pupilinfo = False):
+    """Calculates the pupil size and distance from screen statistics for a list of "Datapoint"s in a single pass
+
+    Both signals are read from the same walk over the samples. A pupil size or distance of -1 marks the
+    sample as missing for that signal. The sum of squared deviations is accumulated with Welford's method.
+
+    Args:
+        all_data: a list of "Datapoint"s
+
+        rest_pupil_size: the rest pupil size that is subtracted from each valid pupil size
+
+        export_pupilinfo: a boolean determining whether [timestamp, pupil size, adjusted pupil size]
+            rows should be collected for the valid pupil samples
+
+    Returns:
+        pupil: a dict with the Moments of the adjusted pupil sizes ('moments'), the number of valid gaze
+            samples (gazepointxleft > 0) with no pupil size ('invalid') and the export rows ('export')
+        distance: a dict with the Moments of the distances from screen ('moments') and the number of valid
+            gaze samples (gazepointxleft >= 0) with no distance ('invalid')
+    """
+    pupilinfo = []
+    pupil = Moments()
+    distance = Moments()
+    pupil_invalid = 0
+    distance_invalid = 0
+    pupil_mean = distance_mean = 0.0
+    for d in all_data:
+        if d.pupilsize == -1:
+            if d.gazepointxleft > 0:
+                pupil_invalid += 1
+        else:
+            val = d.pupilsize - rest_pupil_size
+            if export_pupilinfo:
+                pupilinfo.append([d.timestamp, d.pupilsize, val])
+            if pupil.count == 0:
+                pupil.min = pupil.max = pupil.first = val
+            elif val < pupil.min:
+                pupil.min = val
+            elif val > pupil.max:
+                pupil.max = val
+            pupil.count += 1
+            pupil.sum += val
+            delta = val - pupil_mean
+            pupil_mean += delta / float(pupil.count)
+            pupil.m2 += delta * (val - pupil_mean)
+            pupil.last = val
+        if d.distance == -1:
+            if d.gazepointxleft >= 0:
+                distance_invalid += 1
+        else:
+            val = d.distance
+            if distance.count == 0:
+                distance.min = distance.max = distance.first = val
+            elif val < distance.min:
+                distance.min = val
+            elif val > distance.max:
+                distance.max = val
+            distance.count += 1
+            distance.sum += val
+            delta = val - distance_mean
+            distance_mean += delta / float(distance.count)
+            distance.m2 += delta * (val - distance_mean)
+            distance.last = val
+
+    return {'moments': pupil, 'invalid': pupil_invalid, 'export': pupilinfo}, \
+           {'moments': distance, 'invalid': distance_invalid}
+
+
+EVENT_TYPE_CODES = {'LeftMouseClick': 1, 'RightMouseClick': 2, 'KeyPress': 3}
+"""the type codes of the "Event"s in EventArrays.types, 0 for the other events"""
+
+LEFTCLIC, RIGHTCLIC, KEYPRESS = 1, 2, 3
+
+DOUBLECLIC_TIME = 700
+"""the maximum time (ms) between the two left clics of a double clic"""
+
+DOUBLECLIC_DISTANCE = 10
+"""the maximum difference (in pixels) between the x (and y) coordinates of the two left clics of a double clic"""
+
+
+class EventArrays():
+    """The "Event"s of a Segment as parallel arrays, one entry per Event
+    
+    Attributes:
+        types: an array of the type codes of the events (see EVENT_TYPE_CODES)
+        timestamps: a list of the timestamps of the events
+        xs: a list of the x coordinates of the mouse clics, None for the other events
+        ys: a list of the y coordinates of the mouse clics, None for the other events
+    The timestamps and coordinates keep their original values, as the AOI hit-tests depend on
+    whether they are integers.
+    """
+    def __init__(self, event_data):
+        """Inits EventArrays class
+        
+        Args:
+            event_data: a list of "Event"s
+        """
+        self.types = array('b', map(lambda e: EVENT_TYPE_CODES.get(e.event, 0), event_data))
+        self.timestamps = map(attrgetter('timestamp'), event_data)
+        self.xs = map(lambda (e, code): e.data1 if code == LEFTCLIC or code == RIGHTCLIC else None,
+                      zip(event_data, self.types))
+        self.ys = map(lambda (e, code): e.data2 if code == LEFTCLIC or code == RIGHTCLIC else None,
+                      zip(event_data, self.types))
+
+    def __len__(self):
+        return len(self.types)
+
+    def get_clics(self):
+        """Returns the indices of the left and right mouse clics
+        """
+        types = self.types
+        return filter(lambda i: types[i] == LEFTCLIC or types[i] == RIGHTCLIC, xrange(len(types)))
+
+    def classify(self, indices = None):
+        """Splits events into left clics, right clics, double clics and keys pressed
+        
+        Two consecutive left clics are a double clic if the second one is at most DOUBLECLIC_TIME ms after
+        the first one, and its coordinates are at most DOUBLECLIC_DISTANCE pixels more than the ones of the
+        first one. The first clic of a double clic is not a left clic, and the second clic of a double clic
+        cannot be the first clic of another one. The conditions are checked for all the pairs of consecutive
+        left clics at once, and only the candidate pairs are walked through.
+        
+        Args:
+            indices: an optional list of indices of the events to consider, in order. All events if None
+        
+        Returns:
+            lists of the indices of the left clics, right clics, double clics and keys pressed
+        """
+        if indices is None:
+            indices = xrange(len(self.types))
+        types = self.types
+        lefts = filter(lambda i: types[i] == LEFTCLIC, indices)
+        rightc = filter(lambda i: types[i] == RIGHTCLIC, indices)
+        keyp = filter(lambda i: types[i] == KEYPRESS, indices)
+        ts = map(lambda i: self.timestamps[i], lefts)
+        xs = map(lambda i: self.xs[i], lefts)
+        ys = map(lambda i: self.ys[i], lefts)
+        candidates = filter(lambda k: ts[k] - ts[k-1] <= DOUBLECLIC_TIME and xs[k] - xs[k-1] <= DOUBLECLIC_DISTANCE
+                            and ys[k] - ys[k-1] <= DOUBLECLIC_DISTANCE, xrange(1, len(lefts)))
+        doubles = []
+        for k in candidates:
+            if not doubles or doubles[-1] != k - 1:
+                doubles.append(k)
+        paired = set(doubles) | set(map(lambda k: k - 1, doubles))
+        leftc = map(lambda k: lefts[k], filter(lambda k: k not in paired, xrange(len(lefts))))
+        doublec = map(lambda k: lefts[k], doubles)
+        return (leftc, rightc, doublec, keyp)
+
+
+class GazeArrays():
+    """The valid gaze samples of a Segment as parallel arrays, one entry per sample
+    
+    A sample is kept if it is valid and has both gaze coordinates.
+    
+    Attributes:
+        timestamps: a list of the timestamps of the samples
+        xs: a list of the x coordinates of the gaze points
+        ys: a list of the y coordinates of the gaze points
+    """
+    def __init__(self, all_data):
+        """Inits GazeArrays class
+        
+        Args:
+            all_data: a list of "Datapoint"s
+        """
+        samples = filter(lambda d: d.is_valid and d.gazepointx is not None and d.gazepointy is not None, all_data)
+        self.timestamps = map(attrgetter('timestamp'), samples)
+        self.xs = map(attrgetter('gazepointx'), samples)
+        self.ys = map(attrgetter('gazepointy'), samples)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def get_range(self, start, end):
+        """Returns the indices of the first sample at or after start and of the first sample after end
+        """
+        return bisect.bisect_left(self.timestamps, start), bisect.bisect_right(self.timestamps, end)
+
 
 def generate_event_lists(event_data):
     """Returns separate list per type of events. Format:
@@ -155,32 +771,8 @@ def generate_event_lists(event_data):
     Returns:
         lists of left clics, right clics, double clics and keys pressed
     """
-    leftc = []
-    rightc = []
-    doublec = []
-    keyp = []
-    double_clic_current = False
-    time_prev_clic = -10000
-    x_prev_clic = -10000
-    y_prev_clic = -10000
-    for e in event_data:
-        if e.event == "KeyPress":
-            keyp.append(e)
-        elif e.event == "LeftMouseClick":
-            if double_clic_current and (e.timestamp - time_prev_clic) <= 700 and (e.data1-x_prev_clic)<=10 and (e.data2-y_prev_clic)<=10: #We define here a a double clic as two clics in no more than 700ms in a same area
-                doublec.append(e)
-                double_clic_current = False
-                leftc.pop()
-            else: #no double clic
-                leftc.append(e)
-                double_clic_current = True
-                time_prev_clic = e.timestamp
-                x_prev_clic = e.data1
-                y_prev_clic = e.data2
-        elif e.event == "RightMouseClick":
-            rightc.append(e)
-
-    return (leftc, rightc, doublec, keyp)
+    lists = EventArrays(event_data).classify()
+    return tuple(map(lambda indices: map(lambda i: event_data[i], indices), lists))
 
 
 def cast_float(string, invalid_value=None):
@@ -217,3 +809,116 @@ def cast_int(string, invalid_value=None):
     except ValueError:
         return None
     return string_as_int
+
+def compile_accessor(feat):
+    """a helper method that turns a feature expression into a function that reads it from an object
+
+    The expression is parsed once and the resulting function is cached, so it can be applied to many
+    objects without evaluating a string for each of them.
+
+    Args:
+        feat: a string with an attribute name, optionally followed by dict keys and nested attributes,
+            e.g., 'numsamples' or "features['meanfixationduration']"
+
+    Returns:
+        a function that takes an object and returns the value of the expression for that object
+    """
+    if feat in _accessors:
+        return _accessors[feat]
+    if _attribute_path.match(feat):
+        getter = attrgetter(feat)
+    else:
+        steps = []
+        pos = 0
+        while pos < len(feat):
+            step = _accessor_step.match(feat, pos)
+            if step is None or (pos == 0 and step.group(1) is None):
+                raise Exception('Invalid feature expression: ' + feat)
+            if step.group(1) is not None:
+                steps.append(attrgetter(step.group(1)))
+            else:
+                steps.append(itemgetter(step.group(2) if step.group(2) is not None else step.group(3)))
+            pos = step.end()
+        def getter(obj):
+            for step in steps:
+                obj = step(obj)
+            return obj
+    _accessors[feat] = getter
+    return getter
+
+_accessors = {}
+_attribute_path = re.compile(r"^\w+(\.\w+)*$")
+_accessor_step = re.compile(r"\.?(\w+)|\['([^']*)'\]|\[\"([^\"]*)\"\]")
+
+
+def compile_aggregations(spec):
+    """a helper method that compiles a declarative aggregation specification
+
+    Args:
+        spec: a list of tuples of the form (name, kind, feat, weight) where name is the key of the
+            result, kind is one of 'sum', 'min', 'max', 'first' and 'weightedmean', feat is the feature
+            expression to aggregate and weight is the feature expression of the weight for 'weightedmean'
+            (None for the other kinds)
+
+    Returns:
+        a list of tuples of the form (name, kind, getter, weightgetter) to be passed to aggregate()
+    """
+    compiled = []
+    for (name, kind, feat, weight) in spec:
+        if kind not in ('sum', 'min', 'max', 'first', 'weightedmean'):
+            raise Exception('Unknown aggregation kind: ' + kind)
+        compiled.append((name, kind, compile_accessor(feat), compile_accessor(weight) if weight else None))
+    return compiled
+
+def aggregate(obj_list, compiled_spec):
+    """a helper method that calculates all aggregations of a compiled specification in one pass over a list of objects
+
+    Args:
+        obj_list: a list of objects, e.g., "Segment"s
+
+        compiled_spec: a compiled aggregation specification returned by compile_aggregations()
+
+    Returns:
+        a dict with the name of each aggregation as key and its value over obj_list as value
+    """
+    results = {}
+    weights = {}
+    for (name, kind, _, _) in compiled_spec:
+        if kind == 'sum':
+            results[name] = 0
+        elif kind == 'min':
+            results[name] = float('+infinity')
+        elif kind == 'max':
+            results[name] = float('-infinity')
+        elif kind == 'first':
+            results[name] = None
+        else:
+            results[name] = float(0)
+            weights[name] = 0
+    first = True
+    for obj in obj_list:
+        for (name, kind, getter, weightgetter) in compiled_spec:
+            if kind == 'sum':
+                results[name] += getter(obj)
+            elif kind == 'min':
+                val = getter(obj)
+                if results[name] > val:
+                    results[name] = val
+            elif kind == 'max':
+                val = getter(obj)
+                if results[name] < val:
+                    results[name] = val
+            elif kind == 'first':
+                if first:
+                    results[name] = getter(obj)
+            else:
+                t = weightgetter(obj)
+                results[name] += t * getter(obj)
+                weights[name] += t
+        first = False
+    for name, num in weights.iteritems():
+        if num != 0:
+            results[name] = results[name] / num
+        else:
+            results[name] = 0
+    return results